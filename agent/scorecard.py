@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+from typing import Dict, List
+
+from montage.assembler import Timeline, TimelineItem
+
+
+class ScorecardEvaluator:
+    """Incremental twin of SelfEditingAgent.evaluate for one timeline's lifetime.
+
+    Per-item contributions are cached against a fingerprint of the item, so each call only
+    rescans items whose clip, transition or segment changed since the previous call.
+    """
+
+    def __init__(self, context: Dict) -> None:
+        keywords = context.get("lyrics", {}).get("keywords", [])
+        self._has_keywords = bool(keywords)
+        self._keywords = list(keywords[:4])
+        self._bpm = context.get("audio", {}).get("bpm", 120)
+        self._fingerprints: list[tuple] = []
+        self._reset(0)
+
+    def evaluate(self, timeline: Timeline) -> Dict:
+        items = timeline.items
+        target = (60.0 / self._bpm) * 4
+        if len(items) != len(self._fingerprints):
+            self._reset(len(items))
+            changed = range(len(items))
+        else:
+            changed = [idx for idx, item in enumerate(items) if _fingerprint(item) != self._fingerprints[idx]]
+
+        pairs: set[int] = set()
+        for idx in changed:
+            self._update_item(idx, items[idx], target)
+            pairs.add(idx)
+            pairs.add(idx + 1)
+        for idx in pairs:
+            if 0 < idx < len(items):
+                self._update_pair(idx, items[idx - 1], items[idx])
+
+        count = len(items)
+        if not self._has_keywords:
+            relevance = 78
+        else:
+            relevance = max(50, min(100, int(55 + (self._hits / max(1, count)) * 45)))
+        if count:
+            continuity = max(55, 96 - self._jolts * 8)
+            variety = max(45, min(100, int(40 + (len(self._hash_members) / count) * 60)))
+            pacing = max(55, min(100, int(100 - (sum(self._deviation) / count) * 75)))
+            if self._missing:
+                technical = 35
+            elif timeline.duration <= 0:
+                technical = 30
+            else:
+                technical = 96
+        else:
+            continuity = variety = pacing = technical = 0
+        total = int((relevance + continuity + variety + pacing + technical) / 5)
+        return {
+            "total": total,
+            "relevance": relevance,
+            "continuity": continuity,
+            "variety": variety,
+            "pacing": pacing,
+            "technical": technical,
+            "issues": self._issues(),
+        }
+
+    def _reset(self, count: int) -> None:
+        self._fingerprints = [()] * count
+        self._relevant = [False] * count
+        self._off_beat = [False] * count
+        self._exists = [True] * count
+        self._deviation = [0.0] * count
+        self._hashes: list[str | None] = [None] * count
+        self._jolt = [False] * count
+        self._abrupt = [False] * count
+        self._hash_members: dict[str, set[int]] = {}
+        self._first_index: dict[str, int] = {}
+        self._hits = 0
+        self._jolts = 0
+        self._missing = 0
+
+    def _update_item(self, idx: int, item: TimelineItem, target: float) -> None:
+        previous = self._fingerprints[idx]
+        fingerprint = _fingerprint(item)
+        self._fingerprints[idx] = fingerprint
+
+        relevant = any(k in item.segment.prompt.lower() for k in self._keywords)
+        self._hits += int(relevant) - int(self._relevant[idx])
+        self._relevant[idx] = relevant
+
+        self._deviation[idx] = abs(item.segment.duration - target) / target
+        self._off_beat[idx] = abs(item.segment.duration - target) > 1.2
+
+        if not previous or previous[0] is not item.clip or previous[1] != item.clip.path:
+            exists = item.clip.path.exists()
+            self._missing += int(not exists) - int(not self._exists[idx])
+            self._exists[idx] = exists
+
+        old_hash = self._hashes[idx]
+        new_hash = item.clip.visual_hash
+        if old_hash != new_hash:
+            if old_hash is not None:
+                members = self._hash_members[old_hash]
+                members.discard(idx)
+                if members:
+                    self._first_index[old_hash] = min(members)
+                else:
+                    del self._hash_members[old_hash]
+                    del self._first_index[old_hash]
+            self._hash_members.setdefault(new_hash, set()).add(idx)
+            first = self._first_index.get(new_hash)
+            self._first_index[new_hash] = idx if first is None else min(first, idx)
+            self._hashes[idx] = new_hash
+
+    def _update_pair(self, idx: int, prev: TimelineItem, curr: TimelineItem) -> None:
+        delta = abs(curr.segment.energy - prev.segment.energy)
+        jolt = delta > 0.4 and prev.transition == "cut"
+        self._jolts += int(jolt) - int(self._jolt[idx])
+        self._jolt[idx] = jolt
+        self._abrupt[idx] = prev.transition == "cut" and curr.transition == "cut" and delta > 0.35
+
+    def _issues(self) -> List[Dict]:
+        issues: list[dict] = []
+        for idx, key in enumerate(self._hashes):
+            if self._first_index[key] < idx:
+                issues.append({"segment_index": idx, "reason": "repetition", "severity": "medium"})
+            if self._has_keywords and not self._relevant[idx]:
+                issues.append({"segment_index": idx, "reason": "low_relevance", "severity": "high"})
+            if self._off_beat[idx]:
+                issues.append({"segment_index": idx, "reason": "off_beat", "severity": "medium"})
+            if self._abrupt[idx]:
+                issues.append({"segment_index": idx, "reason": "abrupt_transition", "severity": "medium"})
+        return issues
+
+
+def _fingerprint(item: TimelineItem) -> tuple:
+    segment = item.segment
+    return (item.clip, item.clip.path, item.clip.visual_hash, item.transition, segment.prompt, segment.duration, segment.energy)
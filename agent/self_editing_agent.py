@@ -3,6 +3,7 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Dict, List, Tuple
 
+from agent.scorecard import ScorecardEvaluator
 from montage.assembler import Timeline, TimelineItem
 from providers.mock_provider import MockVideoProvider
 
@@ -33,8 +34,9 @@ class SelfEditingAgent:
             "audio": audio_analysis,
             "lyrics": lyrics_summary,
         }
+        evaluator = ScorecardEvaluator(context)
         best_timeline = timeline
-        best_scorecard = self.evaluate(timeline, context)
+        best_scorecard = evaluator.evaluate(timeline)
         spent = 0
         iterations = [best_scorecard]
 
@@ -53,7 +55,7 @@ class SelfEditingAgent:
 
             candidate = self.apply_fixes(best_timeline, edit_plan, provider, aspect_ratio)
             spent += estimated_cost
-            scorecard = self.evaluate(candidate, context)
+            scorecard = evaluator.evaluate(candidate)
             scorecard["iteration"] = iteration
             iterations.append(scorecard)
 
@@ -126,7 +128,9 @@ class SelfEditingAgent:
             if keywords and not any(k in item.segment.prompt.lower() for k in keywords[:4]):
                 issues.append(Issue(idx, "low_relevance", "high"))
 
-            if abs(item.segment.duration - beat_chunk) > 1.2:
+            # Cuts belong on bar lines: a segment is off beat when it is more than a beat away from
+            # a whole number of bars, however many bars it spans.
+            if _bar_deviation(item.segment.duration, beat_chunk) > beat_chunk / 4:
                 issues.append(Issue(idx, "off_beat", "medium"))
 
             if idx > 0 and timeline.items[idx - 1].transition == "cut" and item.transition == "cut":
@@ -168,7 +172,7 @@ class SelfEditingAgent:
         target = (60.0 / bpm) * 4
         if not timeline.items:
             return 0
-        avg_dev = sum(abs(item.segment.duration - target) / target for item in timeline.items) / len(timeline.items)
+        avg_dev = sum(_bar_deviation(item.segment.duration, target) / target for item in timeline.items) / len(timeline.items)
         return max(55, min(100, int(100 - avg_dev * 75)))
 
     def _technical_score(self, timeline: Timeline) -> int:
@@ -193,3 +197,7 @@ class SelfEditingAgent:
             "self_editing_agent": "on",
         }
 
+
+def _bar_deviation(duration: float, bar: float) -> float:
+    """Seconds between duration and the nearest whole number of bars (at least one)."""
+    return abs(duration - max(1, round(duration / bar)) * bar)
@@ -2,13 +2,17 @@ from __future__ import annotations
 
 import hashlib
 import json
-import subprocess
 from pathlib import Path
 from typing import Dict, List
 
+from analysis.cache import analysis_cache
+from analysis.engine import analyze_pcm
+from core.config import settings
+from core.procs import run_process
+
 
 def _run(cmd: list[str]) -> str:
-    result = subprocess.run(cmd, capture_output=True, text=True, check=False)
+    result = run_process(cmd, kind="ffprobe")
     if result.returncode != 0:
         raise RuntimeError(result.stderr.strip() or "ffprobe failed")
     return result.stdout.strip()
@@ -28,9 +32,43 @@ def probe_duration(audio_path: Path) -> float:
     return float(out)
 
 
-def analyze_audio(audio_path: Path, mode: str) -> Dict:
+def probe_audio_codec(audio_path: Path) -> str:
+    return _run([
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "a:0",
+        "-show_entries",
+        "stream=codec_name",
+        "-of",
+        "default=noprint_wrappers=1:nokey=1",
+        str(audio_path),
+    ])
+
+
+def analyze_audio(audio_path: Path, mode: str, content_hash: str | None = None) -> Dict:
+    content_hash = content_hash or _file_sha256(audio_path)
+    variant = _cache_variant()
+    cached = analysis_cache.get(content_hash, variant)
+    if cached is None:
+        if settings.analysis_engine == "pcm":
+            cached = analyze_pcm(audio_path, energy_resolution=settings.analysis_energy_resolution)
+        else:
+            cached = _analyze_mock(audio_path, content_hash)
+        analysis_cache.put(content_hash, cached, variant)
+    return {**cached, "mode": mode}
+
+
+def _cache_variant() -> str:
+    if settings.analysis_engine == "pcm":
+        return f"pcm{settings.analysis_energy_resolution:g}"
+    return "mock"
+
+
+def _analyze_mock(audio_path: Path, content_hash: str) -> Dict:
     duration = probe_duration(audio_path)
-    seed = int(hashlib.md5(str(audio_path).encode("utf-8")).hexdigest(), 16) % 10000
+    seed = int(content_hash, 16) % 10000
     bpm = 110 + (seed % 40)
     sections = _mock_sections(duration)
     energy = _mock_energy_curve(duration)
@@ -39,10 +77,17 @@ def analyze_audio(audio_path: Path, mode: str) -> Dict:
         "bpm": bpm,
         "sections": sections,
         "energy_curve": energy,
-        "mode": mode,
     }
 
 
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
 def _mock_sections(duration: float) -> List[Dict]:
     if duration <= 0:
         return []
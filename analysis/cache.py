@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, Optional
+
+from core.config import settings
+from core.storage import STORAGE_DIR
+
+# Bump whenever analyze_audio produces different output for the same audio; older entries stop matching.
+ANALYSIS_VERSION = 2
+
+
+class AnalysisCache:
+    """Persistent analysis results keyed by audio content hash, evicted least-recently-used first."""
+
+    def __init__(self, root: Path, max_entries: int) -> None:
+        self.root = root
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, content_hash: str, variant: str = "") -> Optional[Dict]:
+        if self.max_entries <= 0:
+            return None
+        path = self._path(content_hash, variant)
+        try:
+            payload = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        if payload.get("version") != ANALYSIS_VERSION or payload.get("content_hash") != content_hash:
+            path.unlink(missing_ok=True)
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return payload["analysis"]
+
+    def put(self, content_hash: str, analysis: Dict, variant: str = "") -> None:
+        if self.max_entries <= 0:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self._path(content_hash, variant)
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        payload = {"version": ANALYSIS_VERSION, "content_hash": content_hash, "analysis": analysis}
+        tmp.write_text(json.dumps(payload, separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp, path)
+        with self._lock:
+            self._evict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _path(self, content_hash: str, variant: str) -> Path:
+        suffix = f"-{variant}" if variant else ""
+        return self.root / f"{content_hash}{suffix}.v{ANALYSIS_VERSION}.json"
+
+    def _evict(self) -> None:
+        entries = []
+        for path in self.root.glob("*.json"):
+            if not path.name.endswith(f".v{ANALYSIS_VERSION}.json"):
+                path.unlink(missing_ok=True)
+                continue
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except OSError:
+                continue
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort()
+        for _, path in entries[: len(entries) - self.max_entries]:
+            path.unlink(missing_ok=True)
+
+
+analysis_cache = AnalysisCache(STORAGE_DIR / "cache" / "analysis", max_entries=settings.analysis_cache_entries)
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from core.procs import track_process, wait_process
+
+SAMPLE_RATE = 22050
+HOP = 512
+N_FFT = 1024
+BLOCK_SECONDS = 10.0
+MIN_SECTION_SECONDS = 8.0
+NOVELTY_WINDOW_SECONDS = 8
+
+
+def analyze_pcm(audio_path: Path, energy_resolution: float = 1.0) -> Dict:
+    """Decode to mono PCM through an ffmpeg pipe and derive energy, onsets, tempo and sections.
+
+    PCM is consumed block by block and discarded; only per-hop features (~43 floats per second)
+    are kept, so memory does not grow with the size of the decoded audio.
+    """
+    features = _FeatureAccumulator()
+    block_bytes = int(BLOCK_SECONDS * SAMPLE_RATE) * 4
+    # stderr goes to a file: a pipe nobody reads until stdout ends would let a chatty decoder fill it and stall.
+    with tempfile.TemporaryFile() as err:
+        started = time.perf_counter()
+        proc = subprocess.Popen(
+            [
+                "ffmpeg",
+                "-v",
+                "error",
+                "-i",
+                str(audio_path),
+                "-vn",
+                "-ac",
+                "1",
+                "-ar",
+                str(SAMPLE_RATE),
+                "-f",
+                "f32le",
+                "-",
+            ],
+            stdout=subprocess.PIPE,
+            stderr=err,
+        )
+        track_process(proc)
+        try:
+            while True:
+                raw = proc.stdout.read(block_bytes)
+                if not raw:
+                    break
+                usable = len(raw) - len(raw) % 4
+                features.feed(np.frombuffer(raw[:usable], dtype="<f4"))
+        finally:
+            proc.stdout.close()
+            returncode = wait_process(proc, "analysis_decode", started)
+        if returncode != 0:
+            err.seek(0)
+            raise RuntimeError(err.read().decode("utf-8", errors="replace").strip() or "ffmpeg decode failed")
+
+    rms, onset = features.finish()
+    duration = features.total_samples / SAMPLE_RATE
+    frame_rate = SAMPLE_RATE / HOP
+    return {
+        "duration": duration,
+        "bpm": estimate_bpm(onset, frame_rate),
+        "sections": novelty_sections(rms, onset, frame_rate, duration),
+        "energy_curve": energy_curve(rms, frame_rate, energy_resolution),
+    }
+
+
+class _FeatureAccumulator:
+    def __init__(self) -> None:
+        self.total_samples = 0
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._history = np.zeros(N_FFT - HOP, dtype=np.float32)
+        self._window = np.hanning(N_FFT).astype(np.float32)
+        self._prev_mag: np.ndarray | None = None
+        self._rms: list[np.ndarray] = []
+        self._flux: list[np.ndarray] = []
+
+    def feed(self, samples: np.ndarray) -> None:
+        self.total_samples += len(samples)
+        buf = np.concatenate([self._pending, samples])
+        hops = len(buf) // HOP
+        self._pending = buf[hops * HOP :]
+        if hops:
+            self._process(buf[: hops * HOP])
+
+    def finish(self) -> tuple[np.ndarray, np.ndarray]:
+        if len(self._pending):
+            tail = np.zeros(HOP, dtype=np.float32)
+            tail[: len(self._pending)] = self._pending
+            self._pending = np.zeros(0, dtype=np.float32)
+            self._process(tail)
+        if not self._rms:
+            return np.zeros(0), np.zeros(0)
+        return np.concatenate(self._rms).astype(np.float64), np.concatenate(self._flux).astype(np.float64)
+
+    def _process(self, samples: np.ndarray) -> None:
+        hops = samples.reshape(-1, HOP)
+        self._rms.append(np.sqrt(np.mean(hops * hops, axis=1)))
+
+        extended = np.concatenate([self._history, samples])
+        self._history = extended[-(N_FFT - HOP) :]
+        frames = sliding_window_view(extended, N_FFT)[::HOP]
+        mag = np.log1p(100.0 * np.abs(np.fft.rfft(frames * self._window, axis=1)))
+        prev = self._prev_mag if self._prev_mag is not None else mag[:1]
+        flux = np.maximum(np.diff(np.concatenate([prev, mag]), axis=0), 0.0).sum(axis=1)
+        self._prev_mag = mag[-1:]
+        self._flux.append(flux)
+
+
+def estimate_bpm(onset: np.ndarray, frame_rate: float, low: int = 60, high: int = 200) -> int:
+    if len(onset) < frame_rate * 4 or not np.any(onset):
+        return 120
+    x = onset - onset.mean()
+    size = 1 << int(np.ceil(np.log2(2 * len(x))))
+    spectrum = np.fft.rfft(x, size)
+    autocorr = np.fft.irfft(spectrum * np.conj(spectrum), size)[: len(x)]
+    lags = np.arange(int(frame_rate * 60 / high), int(frame_rate * 60 / low) + 1)
+    lags = lags[(lags > 0) & (lags < len(autocorr))]
+    if not len(lags):
+        return 120
+    bpms = 60.0 * frame_rate / lags
+    # Log-normal prior around 120 BPM keeps half/double-tempo peaks from winning.
+    weight = np.exp(-0.5 * np.log2(bpms / 120.0) ** 2)
+    score = autocorr[lags] * weight
+    i = int(np.argmax(score))
+    lag = float(lags[i])
+    if 0 < i < len(score) - 1:
+        # Parabolic interpolation recovers sub-frame lag precision (one hop is ~1 BPM at 130 BPM).
+        y0, y1, y2 = score[i - 1], score[i], score[i + 1]
+        denominator = y0 - 2 * y1 + y2
+        if denominator != 0:
+            lag += 0.5 * (y0 - y2) / denominator
+    return int(round(60.0 * frame_rate / lag))
+
+
+def energy_curve(rms: np.ndarray, frame_rate: float, resolution: float) -> List[Dict]:
+    if not len(rms):
+        return []
+    resolution = max(resolution, 1.0 / frame_rate)
+    times = np.arange(0.0, len(rms) / frame_rate, resolution)
+    starts = np.unique((times * frame_rate).astype(np.int64))
+    times = times[: len(starts)]
+    counts = np.diff(np.append(starts, len(rms)))
+    binned = np.add.reduceat(rms, starts) / counts
+    reference = float(np.percentile(binned, 95))
+    values = np.clip(binned / reference, 0.0, 1.0) if reference > 0 else np.zeros_like(binned)
+    return [{"time": round(float(t), 3), "energy": round(float(v), 2)} for t, v in zip(times, values)]
+
+
+def novelty_sections(rms: np.ndarray, onset: np.ndarray, frame_rate: float, duration: float) -> List[Dict]:
+    if duration <= 0:
+        return []
+    per_second = max(1, int(round(frame_rate)))
+    seconds = len(rms) // per_second
+    if duration < 2 * MIN_SECTION_SECONDS or seconds < 2 * NOVELTY_WINDOW_SECONDS:
+        return [{"start": 0.0, "end": duration, "label": "verse"}]
+
+    usable = seconds * per_second
+    feats = np.stack(
+        [
+            rms[:usable].reshape(seconds, per_second).mean(axis=1),
+            onset[:usable].reshape(seconds, per_second).mean(axis=1),
+        ],
+        axis=1,
+    )
+    feats = (feats - feats.mean(axis=0)) / (feats.std(axis=0) + 1e-9)
+
+    # Novelty at t: distance between the mean feature of the W seconds before and after t.
+    w = NOVELTY_WINDOW_SECONDS
+    csum = np.vstack([np.zeros((1, feats.shape[1])), np.cumsum(feats, axis=0)])
+    t = np.arange(w, seconds - w + 1)
+    before = (csum[t] - csum[t - w]) / w
+    after = (csum[t + w] - csum[t]) / w
+    novelty = np.linalg.norm(after - before, axis=1)
+
+    threshold = novelty.mean() + 0.5 * novelty.std()
+    boundaries: list[float] = []
+    for i in np.argsort(novelty)[::-1]:
+        if novelty[i] < threshold:
+            break
+        candidate = float(t[i]) * per_second / frame_rate
+        if candidate < MIN_SECTION_SECONDS or duration - candidate < MIN_SECTION_SECONDS:
+            continue
+        if all(abs(candidate - b) >= MIN_SECTION_SECONDS for b in boundaries):
+            boundaries.append(candidate)
+    edges = [0.0, *sorted(boundaries), duration]
+
+    seg_energy = []
+    for start, end in zip(edges, edges[1:]):
+        lo, hi = int(start * frame_rate), max(int(start * frame_rate) + 1, int(end * frame_rate))
+        seg_energy.append(float(rms[lo:hi].mean()) if lo < len(rms) else 0.0)
+    median = float(np.median(seg_energy))
+
+    sections = []
+    last = len(edges) - 2
+    for idx, (start, end) in enumerate(zip(edges, edges[1:])):
+        if idx == 0 and last > 0:
+            label = "intro"
+        elif idx == last and last > 1:
+            label = "outro"
+        else:
+            label = "chorus" if seg_energy[idx] > median else "verse"
+        sections.append({"start": start, "end": end, "label": label})
+    return sections
@@ -0,0 +1,92 @@
+"""Run from the backend root: python -m bench.agent_evaluate --segments 2000 8000"""
+
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from agent.scorecard import ScorecardEvaluator
+from agent.self_editing_agent import Issue, SelfEditingAgent
+from montage.assembler import MontageAssembler
+from montage.clip_plan import plan_timeline
+from providers.mock_provider import GeneratedClip, MockVideoProvider
+
+
+class _TouchProvider(MockVideoProvider):
+    """Writes empty clip files instead of calling ffmpeg; only the scorer is being measured."""
+
+    def regenerate_clip(self, segment, aspect_ratio, seed):
+        path = self.output_dir / f"segment-{segment.index}-{seed}.mp4"
+        path.touch()
+        return GeneratedClip(
+            segment_index=segment.index,
+            path=path,
+            prompt=segment.prompt,
+            duration=segment.duration,
+            seed=seed,
+            provider=self.name,
+            visual_hash=f"{segment.section_label}-{seed % 97}",
+        )
+
+
+def run(segments: int, iterations: int) -> dict:
+    duration = segments * 3.2
+    audio = {
+        "duration": duration,
+        "bpm": 124,
+        "mode": "high",
+        "sections": [{"start": t, "end": t + 20.0, "label": "verse" if int(t) % 40 else "chorus"} for t in range(0, int(duration) + 20, 20)],
+        "energy_curve": [{"time": t * 2.0, "energy": round(0.3 + (t % 5) * 0.15, 2)} for t in range(int(duration / 2) + 1)],
+    }
+    lyrics = {"keywords": ["neon", "river", "glow", "echo", "storm"], "sentiment": "reflective", "themes": []}
+    context = {"audio": audio, "lyrics": lyrics}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        provider = _TouchProvider(output_dir=Path(tmp), cache=None)
+        plan = plan_timeline(audio, lyrics, "")
+        for segment in plan.segments[::7]:
+            segment.prompt = segment.prompt.replace("motif", "theme")
+        timeline = MontageAssembler().assemble(plan, provider.generate_clips(plan, "16:9"))
+
+        agent = SelfEditingAgent(mode="high")
+        evaluator = ScorecardEvaluator(context)
+        full_seconds = 0.0
+        incremental_seconds = 0.0
+        for _ in range(iterations + 1):
+            started = time.perf_counter()
+            expected = agent.evaluate(timeline, context)
+            full_seconds += time.perf_counter() - started
+
+            started = time.perf_counter()
+            actual = evaluator.evaluate(timeline)
+            incremental_seconds += time.perf_counter() - started
+
+            if actual != expected:
+                raise AssertionError("incremental scorecard diverged from SelfEditingAgent.evaluate")
+            edit_plan = agent.propose_fixes([Issue(**x) for x in expected["issues"]])
+            edit_plan["replace"] = edit_plan["replace"][:12]
+            edit_plan["transition_adjust"] = edit_plan["transition_adjust"][:12]
+            timeline = agent.apply_fixes(timeline, edit_plan, provider, "16:9")
+
+    return {
+        "segments": len(timeline.items),
+        "evaluations": iterations + 1,
+        "full_ms": round(full_seconds * 1000, 2),
+        "incremental_ms": round(incremental_seconds * 1000, 2),
+        "speedup": round(full_seconds / incremental_seconds, 2) if incremental_seconds else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare full and incremental agent scorecard evaluation.")
+    parser.add_argument("--segments", type=int, nargs="+", default=[500, 2000, 8000])
+    parser.add_argument("--iterations", type=int, default=4)
+    args = parser.parse_args()
+    for segments in args.segments:
+        print(run(segments, args.iterations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Run from the backend root: python -m bench.analysis_throughput --durations 30 180 600"""
+
+from __future__ import annotations
+
+import argparse
+import resource
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from analysis.engine import analyze_pcm
+
+
+def synth_track(path: Path, seconds: float) -> None:
+    # A 128 BPM click over a drone, with a louder middle third and light noise.
+    click = "if(lt(mod(t\\,60/128)\\,0.03)\\,sin(2*PI*880*t)\\,0)"
+    level = f"(0.3+0.7*between(t\\,{seconds / 3:.1f}\\,{2 * seconds / 3:.1f}))"
+    expr = f"{click}*{level}+0.05*sin(2*PI*110*t)+0.01*(random(0)-0.5)"
+    subprocess.run(
+        ["ffmpeg", "-v", "error", "-y", "-f", "lavfi", "-i", f"aevalsrc='{expr}':d={seconds}:s=44100", "-c:a", "aac", str(path)],
+        check=True,
+    )
+
+
+def run(seconds: float, resolution: float) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / f"synthetic-{int(seconds)}s.m4a"
+        synth_track(path, seconds)
+
+        children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu_before = time.process_time()
+        wall_before = time.perf_counter()
+        result = analyze_pcm(path, energy_resolution=resolution)
+        wall = time.perf_counter() - wall_before
+        cpu = time.process_time() - cpu_before
+        children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    decode_cpu = (children_after.ru_utime - children_before.ru_utime) + (children_after.ru_stime - children_before.ru_stime)
+    total_cpu = cpu + decode_cpu
+    return {
+        "audio_seconds": round(result["duration"], 2),
+        "bpm": result["bpm"],
+        "sections": len(result["sections"]),
+        "energy_points": len(result["energy_curve"]),
+        "wall_s": round(wall, 3),
+        "numpy_cpu_s": round(cpu, 3),
+        "decode_cpu_s": round(decode_cpu, 3),
+        "audio_s_per_cpu_s": round(result["duration"] / total_cpu, 1) if total_cpu else None,
+        "numpy_audio_s_per_cpu_s": round(result["duration"] / cpu, 1) if cpu else None,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure analysis engine throughput in audio-seconds per CPU-second.")
+    parser.add_argument("--durations", type=float, nargs="+", default=[30, 180, 600])
+    parser.add_argument("--resolution", type=float, default=1.0)
+    args = parser.parse_args()
+    for seconds in args.durations:
+        print(run(seconds, args.resolution))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""Run from the backend root: python -m bench.api_load --users 50 --seconds 30 --job-latency 2"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+PLAN_DOMAINS = ("pro.tunivo", "studio.tunivo", "example.com")
+STUB_STEPS = ((0.15, "Understand"), (0.30, "Plan"), (0.45, "Generate"), (0.62, "Assemble"), (0.74, "Self-edit"), (0.86, "Export"))
+
+
+def serve(port: int, env: dict, job_latency: float, job_jitter: float, result_kb: int) -> None:
+    # Settings are read at import, so the environment is applied before the app is imported.
+    os.environ.update(env)
+    import uvicorn
+
+    import main
+    from core.jobs import store
+    from core.storage import job_dir
+
+    result = os.urandom(result_kb * 1024)
+
+    def stub_run_job(job_id, req, audio_path) -> None:
+        # The same store writes a real job makes, spread over the configured latency.
+        delay = max(0.0, random.gauss(job_latency, job_jitter)) / (len(STUB_STEPS) + 1)
+        store.update(job_id, status="running", progress=0.05, message="Analyze")
+        for progress, message in STUB_STEPS:
+            time.sleep(delay)
+            store.update(job_id, progress=progress, message=message)
+        time.sleep(delay)
+        output_path = job_dir(job_id) / "output" / "tunivo.mp4"
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.write_bytes(result)
+        store.update(
+            job_id, status="completed", progress=1.0, message="Complete", result_path=str(output_path), report={"stub": True}
+        )
+
+    main.run_job = stub_run_job
+    uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+
+
+class _Connection:
+    """Minimal keep-alive HTTP/1.1 client, so the harness needs nothing beyond the app's own dependencies."""
+
+    def __init__(self, host: str, port: int) -> None:
+        self.host = host
+        self.port = port
+        self._reader = None
+        self._writer = None
+
+    async def request(self, method: str, path: str, headers: dict, body: bytes = b"") -> tuple[int, dict, bytes]:
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        head = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", f"Content-Length: {len(body)}"]
+        head.extend(f"{name}: {value}" for name, value in headers.items())
+        self._writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        try:
+            return await self._read_response()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            self.close()
+            raise
+
+    async def _read_response(self) -> tuple[int, dict, bytes]:
+        raw = await self._reader.readuntil(b"\r\n\r\n")
+        lines = raw.decode("latin-1").split("\r\n")
+        status = int(lines[0].split(" ", 2)[1])
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+        if headers.get("transfer-encoding") == "chunked":
+            chunks = []
+            while True:
+                size = int((await self._reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                chunks.append(await self._reader.readexactly(size + 2))
+                if size == 0:
+                    break
+            body = b"".join(chunk[:-2] for chunk in chunks)
+        else:
+            body = await self._reader.readexactly(int(headers.get("content-length", "0")))
+        if headers.get("connection") == "close":
+            self.close()
+        return status, headers, body
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+
+class _Recorder:
+    def __init__(self) -> None:
+        self.samples: dict[str, list[float]] = {}
+        self.statuses: dict[str, dict[int, int]] = {}
+        self.errors: dict[str, int] = {}
+
+    async def timed(self, endpoint: str, call) -> tuple[int, dict, bytes] | None:
+        started = time.perf_counter()
+        try:
+            status, headers, body = await call
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.LimitOverrunError):
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+            return None
+        self.samples.setdefault(endpoint, []).append(time.perf_counter() - started)
+        counts = self.statuses.setdefault(endpoint, {})
+        counts[status] = counts.get(status, 0) + 1
+        return status, headers, body
+
+    def summary(self, elapsed: float) -> dict:
+        endpoints = {}
+        for endpoint, samples in sorted(self.samples.items()):
+            ordered = sorted(samples)
+            endpoints[endpoint] = {
+                "requests": len(ordered),
+                "rps": round(len(ordered) / elapsed, 1),
+                "p50_ms": _percentile_ms(ordered, 50),
+                "p95_ms": _percentile_ms(ordered, 95),
+                "p99_ms": _percentile_ms(ordered, 99),
+                "max_ms": round(ordered[-1] * 1000, 2),
+                "statuses": {str(status): count for status, count in sorted(self.statuses[endpoint].items())},
+                "errors": self.errors.get(endpoint, 0),
+            }
+        return endpoints
+
+
+def _percentile_ms(ordered: list[float], pct: float) -> float:
+    # Nearest-rank percentile.
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return round(ordered[index] * 1000, 2)
+
+
+def _multipart(upload_kb: int, mode: str) -> tuple[str, bytes]:
+    boundary = uuid.uuid4().hex
+    parts = [
+        f'--{boundary}\r\nContent-Disposition: form-data; name="prompt"\r\n\r\nload test\r\n'.encode(),
+        f'--{boundary}\r\nContent-Disposition: form-data; name="mode"\r\n\r\n{mode}\r\n'.encode(),
+        f'--{boundary}\r\nContent-Disposition: form-data; name="audio"; filename="track.mp3"\r\n'
+        f"Content-Type: audio/mpeg\r\n\r\n".encode(),
+        os.urandom(upload_kb * 1024),
+        f"\r\n--{boundary}--\r\n".encode(),
+    ]
+    return f"multipart/form-data; boundary={boundary}", b"".join(parts)
+
+
+async def simulate_user(index: int, args: argparse.Namespace, port: int, deadline: float, recorder: _Recorder, job_ids: list) -> None:
+    email = f"load-{index}@{PLAN_DOMAINS[index % len(PLAN_DOMAINS)]}"
+    mode = "fast" if email.endswith("example.com") else random.choice(("fast", "high"))
+    content_type, body = _multipart(args.upload_kb, mode)
+    conn = _Connection("127.0.0.1", port)
+    # Stagger the start so users do not upload in lockstep.
+    await asyncio.sleep(random.uniform(0, args.poll_interval))
+    try:
+        while time.monotonic() < deadline:
+            response = await recorder.timed(
+                "POST /api/jobs",
+                conn.request("POST", "/api/jobs", {"X-User-Email": email, "Content-Type": content_type}, body),
+            )
+            if response is None or response[0] != 200:
+                await asyncio.sleep(args.backoff)
+                continue
+            job_id = json.loads(response[2])["id"]
+            job_ids.append(job_id)
+            detail, etag = None, None
+            while time.monotonic() < deadline:
+                await asyncio.sleep(args.poll_interval)
+                headers = {"X-User-Email": email}
+                query = "?compact=1"
+                if args.etag and etag:
+                    headers["If-None-Match"] = etag
+                    if args.wait:
+                        query += f"&wait={args.wait}"
+                response = await recorder.timed("GET /api/jobs/{id}", conn.request("GET", f"/api/jobs/{job_id}{query}", headers))
+                if response is None:
+                    continue
+                status, response_headers, payload = response
+                if status == 200:
+                    etag = response_headers.get("etag")
+                    detail = json.loads(payload)
+                    if detail["status"] in {"completed", "failed"}:
+                        break
+            if detail and detail.get("download_url") and time.monotonic() < deadline:
+                await recorder.timed("GET /api/jobs/{id}/download", conn.request("GET", detail["download_url"], {}))
+    finally:
+        conn.close()
+
+
+async def run_load(args: argparse.Namespace, port: int) -> tuple[dict, list]:
+    recorder = _Recorder()
+    job_ids: list = []
+    started = time.monotonic()
+    deadline = started + args.seconds
+    await asyncio.gather(*(simulate_user(i, args, port, deadline, recorder, job_ids) for i in range(args.users)))
+    return recorder.summary(time.monotonic() - started), job_ids
+
+
+async def wait_until_ready(port: int, timeout: float = 30.0) -> None:
+    conn = _Connection("127.0.0.1", port)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            status, _, _ = await conn.request("GET", "/api/health", {})
+            if status == 200:
+                conn.close()
+                return
+        except OSError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError("server did not start")
+        await asyncio.sleep(0.2)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--job-latency", type=float, default=2.0, help="mean seconds the stubbed run_job takes")
+    parser.add_argument("--job-jitter", type=float, default=0.5)
+    parser.add_argument("--job-workers", type=int, default=32)
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--etag", action="store_true", help="send If-None-Match on polls")
+    parser.add_argument("--wait", type=float, default=0.0, help="long-poll seconds with --etag")
+    parser.add_argument("--upload-kb", type=int, default=512)
+    parser.add_argument("--result-kb", type=int, default=256)
+    parser.add_argument("--rate-limit", type=int, default=100000, help="jobs per user per minute")
+    parser.add_argument("--backoff", type=float, default=1.0, help="pause after a rejected upload")
+    parser.add_argument("--out", type=Path)
+    args = parser.parse_args()
+
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        # Job rows and limiter state go to throwaway databases; job directories are removed afterwards.
+        env = {
+            "TUNIVO_JOB_DB": str(Path(tmp) / "jobs.sqlite3"),
+            "TUNIVO_RATE_LIMIT_DB": str(Path(tmp) / "rate_limit.sqlite3"),
+            "TUNIVO_RATE_LIMIT": str(args.rate_limit),
+            "TUNIVO_JOB_WORKERS": str(args.job_workers),
+            "TUNIVO_JOB_RUNNER": "thread",
+            "TUNIVO_QUEUE_MAX_DEPTH": str(max(100, args.users * 2)),
+        }
+        server = multiprocessing.get_context("spawn").Process(
+            target=serve, args=(port, env, args.job_latency, args.job_jitter, args.result_kb), daemon=True
+        )
+        server.start()
+        try:
+            asyncio.run(wait_until_ready(port))
+            endpoints, job_ids = asyncio.run(run_load(args, port))
+        finally:
+            server.terminate()
+            server.join(10)
+
+    from core.storage import STORAGE_DIR
+
+    for job_id in job_ids:
+        shutil.rmtree(STORAGE_DIR / "jobs" / job_id, ignore_errors=True)
+
+    for endpoint, stats in endpoints.items():
+        print({"endpoint": endpoint, **stats})
+    print({"users": args.users, "seconds": args.seconds, "jobs": len(job_ids), "etag": args.etag})
+    if args.out:
+        args.out.write_text(json.dumps({"args": vars(args) | {"out": str(args.out)}, "endpoints": endpoints}, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
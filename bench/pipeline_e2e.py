@@ -0,0 +1,163 @@
+"""Run from the backend root: python -m bench.pipeline_e2e --durations 30 180 600 --modes fast high --out bench-results.json --baseline bench-baseline.json"""
+
+from __future__ import annotations
+
+import argparse
+import atexit
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from bench.analysis_throughput import synth_track
+
+
+def run_case(seconds: float, mode: str, track: Path, email: str) -> dict:
+    from core.auth import session_from_email
+    from core.jobs import JobRequest, store
+    from core.storage import job_dir
+    from pipeline import run_job
+
+    job = store.create(session_from_email(email))
+    workdir = job_dir(job.id)
+    audio_path = workdir / "input" / track.name
+    audio_path.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(track, audio_path)
+    try:
+        started = time.perf_counter()
+        run_job(job.id, JobRequest(prompt="neon city night drive", mode=mode), audio_path)
+        wall = time.perf_counter() - started
+        finished = store.get(job.id)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if finished.status != "completed":
+        raise RuntimeError(f"{int(seconds)}s/{mode} job failed: {finished.message}")
+    report = finished.report
+    resources = report["resources"]
+    return {
+        "duration": seconds,
+        "mode": mode,
+        "wall_seconds": round(wall, 3),
+        "stages": {name: stage["wall_s"] for name, stage in resources["stages"].items()},
+        "stage_cpu": {name: round(stage["cpu_s"] + stage["subprocess_cpu_s"], 3) for name, stage in resources["stages"].items()},
+        "subprocesses": resources["subprocesses"],
+        "clips": report["generation"]["clips"],
+        # The first scorecard is the assembled timeline, not an agent iteration.
+        "agent_iterations": len(report["iterations"]) - 1,
+        "agent_status": report["status"],
+        "duration_delta_seconds": report["duration_delta_seconds"],
+        "export": report["export"],
+    }
+
+
+def run_suite(durations: list[float], modes: list[str], repeat: int) -> dict:
+    # Pro plan so high mode is allowed; a fresh account per run so the credits allowance never runs out.
+    email = f"bench-{uuid.uuid4().hex[:8]}@pro.tunivo"
+    cases = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for seconds in durations:
+            track = Path(tmp) / f"synthetic-{int(seconds)}s.m4a"
+            synth_track(track, seconds)
+            for mode in modes:
+                runs = [run_case(seconds, mode, track, email) for _ in range(repeat)]
+                # The median run by wall time, so one noisy run does not move the result.
+                result = sorted(runs, key=lambda run: run["wall_seconds"])[len(runs) // 2]
+                result["runs_wall_seconds"] = [run["wall_seconds"] for run in runs]
+                cases[f"{int(seconds)}s-{mode}"] = result
+                print({"case": f"{int(seconds)}s-{mode}", "wall_seconds": result["wall_seconds"], "clips": result["clips"]})
+    return {"created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "cpu_count": os.cpu_count(), "cases": cases}
+
+
+def compare(current: dict, baseline: dict, max_slowdown: float, min_seconds: float, max_delta: float, stage_slowdown: dict) -> list[dict]:
+    """Return one entry per metric that regressed beyond its threshold."""
+    regressions = []
+    for name, case in current["cases"].items():
+        base = baseline.get("cases", {}).get(name)
+        if base is None:
+            continue
+        timings = [("wall_seconds", case["wall_seconds"], base["wall_seconds"], max_slowdown)]
+        for stage, seconds in case["stages"].items():
+            if stage in base["stages"]:
+                timings.append((f"stage:{stage}", seconds, base["stages"][stage], stage_slowdown.get(stage, max_slowdown)))
+        for metric, value, before, limit in timings:
+            # Both a relative and an absolute margin, so sub-second stages do not flap on noise.
+            if value > before * (1.0 + limit) and value - before > min_seconds:
+                regressions.append({"case": name, "metric": metric, "baseline": before, "current": value, "limit": limit})
+        if case["duration_delta_seconds"] - base["duration_delta_seconds"] > max_delta:
+            regressions.append(
+                {
+                    "case": name,
+                    "metric": "duration_delta_seconds",
+                    "baseline": base["duration_delta_seconds"],
+                    "current": case["duration_delta_seconds"],
+                    "limit": max_delta,
+                }
+            )
+        if case["clips"] != base["clips"]:
+            regressions.append({"case": name, "metric": "clips", "baseline": base["clips"], "current": case["clips"], "limit": 0})
+    return regressions
+
+
+def _stage_limits(values: list[str]) -> dict:
+    limits = {}
+    for value in values:
+        stage, _, ratio = value.partition("=")
+        if not ratio:
+            raise argparse.ArgumentTypeError(f"expected STAGE=RATIO, got {value!r}")
+        limits[stage] = float(ratio)
+    return limits
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--durations", type=float, nargs="+", default=[30.0, 180.0, 600.0])
+    parser.add_argument("--modes", nargs="+", choices=["fast", "high"], default=["fast", "high"])
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--out", type=Path, default=Path("bench-results.json"))
+    parser.add_argument("--baseline", type=Path, help="compare against this results file and exit 1 on regression")
+    parser.add_argument("--update-baseline", action="store_true", help="write the results to --baseline instead of comparing")
+    parser.add_argument("--max-slowdown", type=float, default=0.2, help="allowed relative wall-time increase")
+    parser.add_argument("--min-seconds", type=float, default=0.5, help="ignore increases smaller than this")
+    parser.add_argument("--max-delta", type=float, default=0.05, help="allowed increase of the output duration delta")
+    parser.add_argument("--stage-slowdown", nargs="*", default=[], metavar="STAGE=RATIO", help="per-stage --max-slowdown")
+    parser.add_argument("--warm-caches", action="store_true", help="keep the clip and analysis caches enabled")
+    args = parser.parse_args()
+
+    # Settings are read at import, so this has to happen before the pipeline is imported.
+    # Jobs, credits and caches go to a throwaway storage root, away from the real job database and ledger.
+    storage = Path(tempfile.mkdtemp(prefix="tunivo-bench-"))
+    # Registered before the ledger starts, so it runs after the ledger's own atexit close.
+    atexit.register(shutil.rmtree, storage, ignore_errors=True)
+    os.environ["TUNIVO_STORAGE_DIR"] = str(storage)
+    os.environ["TUNIVO_JOB_DB"] = str(storage / "jobs.sqlite3")
+    if not args.warm_caches:
+        os.environ["TUNIVO_CLIP_CACHE_MB"] = "0"
+        os.environ["TUNIVO_ANALYSIS_CACHE_ENTRIES"] = "0"
+
+    results = run_suite(args.durations, args.modes, max(1, args.repeat))
+    args.out.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+    print({"results": str(args.out), "cases": len(results["cases"])})
+
+    if args.baseline is None:
+        return
+    if args.update_baseline or not args.baseline.exists():
+        args.baseline.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+        print({"baseline": str(args.baseline), "written": True})
+        return
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    regressions = compare(
+        results, baseline, args.max_slowdown, args.min_seconds, args.max_delta, _stage_limits(args.stage_slowdown)
+    )
+    for regression in regressions:
+        print(regression)
+    print({"baseline": str(args.baseline), "regressions": len(regressions)})
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Run from the backend root: python -m bench.rate_limit --threads 1 4 16 --processes 4"""
+
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from core.rate_limit import GcraLimiter, SqliteGcraLimiter
+
+
+def _hammer(limiter, calls: int, keys: int, offset: int) -> int:
+    allowed = 0
+    for i in range(calls):
+        allowed += limiter.allow(f"user{(i + offset) % keys}@bench")
+    return allowed
+
+
+def run_threads(limiter, threads: int, calls: int, keys: int) -> dict:
+    results = [0] * threads
+
+    def work(idx: int) -> None:
+        results[idx] = _hammer(limiter, calls, keys, idx * 7919)
+
+    workers = [threading.Thread(target=work, args=(idx,)) for idx in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    wall = time.perf_counter() - started
+    total = threads * calls
+    return {
+        "backend": type(limiter).__name__,
+        "threads": threads,
+        "calls": total,
+        "allowed": sum(results),
+        "allow_per_s": round(total / wall),
+        "us_per_call": round(wall / total * 1e6, 2),
+    }
+
+
+def _process_worker(path: str, max_events: int, calls: int, keys: int, offset: int, out) -> None:
+    out.put(_hammer(SqliteGcraLimiter(Path(path), max_events), calls, keys, offset))
+
+
+def run_processes(path: Path, processes: int, calls: int, keys: int, max_events: int) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    out = ctx.Queue()
+    procs = [
+        ctx.Process(target=_process_worker, args=(str(path), max_events, calls, keys, idx * 7919, out))
+        for idx in range(processes)
+    ]
+    started = time.perf_counter()
+    for proc in procs:
+        proc.start()
+    allowed = sum(out.get() for _ in procs)
+    for proc in procs:
+        proc.join()
+    wall = time.perf_counter() - started
+    total = processes * calls
+    return {
+        "backend": "SqliteGcraLimiter",
+        "processes": processes,
+        "calls": total,
+        "allowed": allowed,
+        # A shared limit admits max_events per key in total, not per process.
+        "expected_allowed": keys * max_events,
+        "allow_per_s": round(total / wall),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure rate limiter allow() throughput under contention.")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--calls", type=int, default=20000, help="allow() calls per thread or process")
+    parser.add_argument("--keys", type=int, default=1000)
+    parser.add_argument("--max-events", type=int, default=6)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        for threads in args.threads:
+            print(run_threads(GcraLimiter(args.max_events), threads, args.calls, args.keys))
+            path = Path(tmp) / f"threads-{threads}.sqlite3"
+            print(run_threads(SqliteGcraLimiter(path, args.max_events), threads, args.calls, args.keys))
+        if args.processes:
+            print(run_processes(Path(tmp) / "processes.sqlite3", args.processes, args.calls, args.keys, args.max_events))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from core.config import settings
+from core.storage import STORAGE_DIR
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX hosts fall back to copying
+    fcntl = None
+
+# Bump when render_clip output changes for identical inputs.
+CLIP_RENDER_VERSION = 1
+_FICLONE = 0x40049409
+
+
+class ClipCache:
+    """Content-addressed store of rendered clips, shared by every job.
+
+    The LRU index lives in a SQLite file next to the clips, so every API and worker process on
+    the host evicts against one byte budget instead of each assuming it owns the directory.
+    """
+
+    def __init__(self, root: Path, max_bytes: int) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._ready = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def key_for(self, provider: str, prompt: str, section: str, duration: float, aspect_ratio: str, seed: int) -> str:
+        raw = json.dumps(
+            {
+                "v": CLIP_RENDER_VERSION,
+                "provider": provider,
+                "prompt": prompt,
+                "section": section,
+                "duration": round(duration, 3),
+                "aspect_ratio": aspect_ratio,
+                "seed": seed,
+            },
+            sort_keys=True,
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def fetch(self, key: str, dest: Path) -> bool:
+        if not self.enabled:
+            return False
+        path = self._path(key)
+        conn = self._conn()
+        found = conn.execute("UPDATE clips SET used = ? WHERE key = ? RETURNING size", (time.time(), key)).fetchone()
+        if found is not None and not path.exists():
+            conn.execute("DELETE FROM clips WHERE key = ?", (key,))
+            found = None
+        try:
+            if found is None:
+                raise FileNotFoundError(path)
+            # Another process may evict the file between the lookup and the link; that is a miss.
+            _link_or_copy(path, dest)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def put(self, key: str, src: Path) -> None:
+        if not self.enabled:
+            return
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{key}.{uuid.uuid4().hex}.tmp")
+        try:
+            _link_or_copy(src, tmp)
+            os.replace(tmp, path)
+        except OSError:
+            tmp.unlink(missing_ok=True)
+            return
+        size = path.stat().st_size
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                """
+                INSERT INTO clips (key, size, used) VALUES (?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET size = excluded.size, used = excluded.used
+                """,
+                (key, size, time.time()),
+            )
+            evicted = self._evict(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        for stale in evicted:
+            self._path(stale).unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        entries, total = 0, 0
+        if self.enabled:
+            entries, total = self._conn().execute("SELECT count(*), coalesce(sum(size), 0) FROM clips").fetchone()
+        with self._lock:
+            lookups = self.hits + self.misses
+            # hits/misses count this process only; entries and bytes are the shared index.
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": entries,
+                "bytes": total,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.mp4"
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.root.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.root / "index.sqlite3", timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # The index can be rebuilt from the files; a lost write at worst re-renders or orphans one clip.
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+            with self._lock:
+                if not self._ready:
+                    self._setup(conn)
+                    self._ready = True
+        return conn
+
+    def _setup(self, conn: sqlite3.Connection) -> None:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'clips'").fetchone() is None:
+                conn.execute("CREATE TABLE clips (key TEXT PRIMARY KEY, size INTEGER NOT NULL, used REAL NOT NULL) WITHOUT ROWID")
+                conn.execute("CREATE INDEX clips_used ON clips (used)")
+                # Clips cached before the index existed are adopted in mtime order.
+                for path in self.root.glob("*/*.mp4"):
+                    try:
+                        stat = path.stat()
+                    except OSError:
+                        continue
+                    conn.execute("INSERT INTO clips (key, size, used) VALUES (?, ?, ?)", (path.stem, stat.st_size, stat.st_mtime))
+            evicted = self._evict(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        for stale in evicted:
+            self._path(stale).unlink(missing_ok=True)
+
+    def _evict(self, conn: sqlite3.Connection) -> list[str]:
+        # Runs inside the caller's write transaction, so concurrent puts never both free the same space.
+        excess = conn.execute("SELECT coalesce(sum(size), 0) FROM clips").fetchone()[0] - self.max_bytes
+        evicted = []
+        if excess <= 0:
+            return evicted
+        for key, size in conn.execute("SELECT key, size FROM clips ORDER BY used").fetchall():
+            if excess <= 0:
+                break
+            evicted.append(key)
+            excess -= size
+        conn.executemany("DELETE FROM clips WHERE key = ?", [(key,) for key in evicted])
+        return evicted
+
+
+def _link_or_copy(src: Path, dest: Path) -> None:
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    dest.unlink(missing_ok=True)
+    try:
+        os.link(src, dest)
+        return
+    except OSError:
+        pass
+    if fcntl is not None:
+        try:
+            with src.open("rb") as fin, dest.open("wb") as fout:
+                fcntl.ioctl(fout.fileno(), _FICLONE, fin.fileno())
+            return
+        except OSError:
+            dest.unlink(missing_ok=True)
+    shutil.copyfile(src, dest)
+
+
+clip_cache = ClipCache(STORAGE_DIR / "cache" / "clips", max_bytes=settings.clip_cache_max_mb * 1024 * 1024)
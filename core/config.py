@@ -29,6 +29,34 @@ class Settings:
     hmac_secret: str = os.getenv("TUNIVO_HMAC_SECRET", "tunivo-dev-secret")
     retention_hours: int = int(os.getenv("TUNIVO_RETENTION_HOURS", "2"))
     max_jobs_per_minute: int = int(os.getenv("TUNIVO_RATE_LIMIT", "6"))
+    rate_limit_backend: str = os.getenv("TUNIVO_RATE_LIMIT_BACKEND", "sqlite")
+    rate_limit_db_path: str = os.getenv("TUNIVO_RATE_LIMIT_DB", "")
+    job_runner: str = os.getenv("TUNIVO_JOB_RUNNER", "thread")
+    worker_lease_seconds: float = float(os.getenv("TUNIVO_WORKER_LEASE_SECONDS", "30"))
+    worker_poll_seconds: float = float(os.getenv("TUNIVO_WORKER_POLL_SECONDS", "1"))
+    worker_max_attempts: int = int(os.getenv("TUNIVO_WORKER_MAX_ATTEMPTS", "3"))
+    cancel_poll_seconds: float = float(os.getenv("TUNIVO_CANCEL_POLL_SECONDS", "1"))
+    job_workers: int = int(os.getenv("TUNIVO_JOB_WORKERS", "2"))
+    job_reserved_pro: int = int(os.getenv("TUNIVO_JOB_RESERVED_PRO", "1"))
+    queue_max_depth: int = int(os.getenv("TUNIVO_QUEUE_MAX_DEPTH", "100"))
+    clip_concurrency: int = int(os.getenv("TUNIVO_CLIP_CONCURRENCY", "4"))
+    clip_global_concurrency: int = int(os.getenv("TUNIVO_CLIP_GLOBAL_CONCURRENCY", "8"))
+    clip_cache_max_mb: int = int(os.getenv("TUNIVO_CLIP_CACHE_MB", "2048"))
+    export_assembly: str = os.getenv("TUNIVO_EXPORT_ASSEMBLY", "concat")
+    export_max_inputs: int = int(os.getenv("TUNIVO_EXPORT_MAX_INPUTS", "16"))
+    export_workers: int = int(os.getenv("TUNIVO_EXPORT_WORKERS", "2"))
+    preview_height: int = int(os.getenv("TUNIVO_PREVIEW_HEIGHT", "240"))
+    max_upload_mb: int = int(os.getenv("TUNIVO_MAX_UPLOAD_MB", "100"))
+    analysis_cache_entries: int = int(os.getenv("TUNIVO_ANALYSIS_CACHE_ENTRIES", "5000"))
+    analysis_engine: str = os.getenv("TUNIVO_ANALYSIS_ENGINE", "pcm")
+    analysis_energy_resolution: float = float(os.getenv("TUNIVO_ANALYSIS_ENERGY_RESOLUTION", "1.0"))
+    storage_dir: str = os.getenv("TUNIVO_STORAGE_DIR", "")
+    job_store: str = os.getenv("TUNIVO_JOB_STORE", "sqlite")
+    job_db_path: str = os.getenv("TUNIVO_JOB_DB", "")
+    events_heartbeat_seconds: float = float(os.getenv("TUNIVO_EVENTS_HEARTBEAT_SECONDS", "15"))
+    events_poll_seconds: float = float(os.getenv("TUNIVO_EVENTS_POLL_SECONDS", "2"))
+    long_poll_max_seconds: float = float(os.getenv("TUNIVO_LONG_POLL_MAX_SECONDS", "30"))
+    plan_snap_to_bars: bool = os.getenv("TUNIVO_PLAN_SNAP_TO_BARS", "0").lower() in {"1", "true", "yes"}
 
 
 settings = Settings()
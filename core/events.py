@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Set, Tuple
+
+
+class JobEventHub:
+    """Wakes asyncio watchers when a job changes; safe to publish from pipeline threads."""
+
+    def __init__(self) -> None:
+        self._watchers: Dict[str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def watch(self, job_id: str) -> Iterator[asyncio.Event]:
+        """Yield an event set on every publish for job_id; clear it before re-reading the job."""
+        entry = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._watchers.setdefault(job_id, set()).add(entry)
+        try:
+            yield entry[1]
+        finally:
+            with self._lock:
+                watchers = self._watchers.get(job_id)
+                if watchers is not None:
+                    watchers.discard(entry)
+                    if not watchers:
+                        del self._watchers[job_id]
+
+    def publish(self, job_id: str) -> None:
+        with self._lock:
+            watchers = list(self._watchers.get(job_id, ()))
+        for loop, event in watchers:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The watcher's loop has already shut down.
+                continue
+
+    def watchers(self) -> int:
+        with self._lock:
+            return sum(len(watchers) for watchers in self._watchers.values())
+
+
+async def wait_for_change(event: asyncio.Event, timeout: float) -> bool:
+    try:
+        await asyncio.wait_for(event.wait(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
+job_events = JobEventHub()
@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from core.config import settings
+from core.jobs import job_db_path
+from core.queue import PLAN_WEIGHTS, QueueFullError, pick_plan, placement_for, pop_next
+
+_EWMA_ALPHA = 0.2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS job_queue (
+    job_id TEXT PRIMARY KEY,
+    user_email TEXT NOT NULL,
+    plan TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    enqueued_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS job_queue_state (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+
+@dataclass
+class LeasedJob:
+    job_id: str
+    user_email: str
+    plan: str
+    payload: Dict
+    attempts: int
+    waited: float
+
+
+class SqliteJobQueue:
+    """Durable job queue that out-of-process workers lease from (see worker.py).
+
+    Dispatch follows the in-process FairScheduler policy: plan passes and each user's last turn
+    live in job_queue_state, so every worker process makes the same choice. A lease that is not
+    heartbeated before it expires makes the job leasable again.
+    """
+
+    def __init__(self, path: Path, max_depth: int, capacity: int, reserved_pro: int) -> None:
+        self.path = path
+        self.max_depth = max(1, max_depth)
+        self.capacity = max(1, capacity)
+        self.reserved_pro = min(max(0, reserved_pro), self.capacity - 1)
+        self._local = threading.local()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+
+    def submit(self, job_id: str, user_email: str, plan: str, payload: Dict) -> Optional[Dict]:
+        plan = plan if plan in PLAN_WEIGHTS else "free"
+        with self._write() as conn:
+            now = time.time()
+            rows = self._rows(conn)
+            ready = [row for row in rows if not _leased(row, now)]
+            if len(ready) >= self.max_depth:
+                self._bump(conn, "rejected", 1)
+                raise QueueFullError("queue_full")
+            passes = self._passes(conn)
+            active = [passes[row["plan"]] for row in ready]
+            if active and not any(row["plan"] == plan for row in ready):
+                # Same idle-plan rule as FairScheduler.submit.
+                self._set(conn, f"pass:{plan}", max(passes[plan], min(active)))
+            conn.execute(
+                "INSERT INTO job_queue (job_id, user_email, plan, payload, enqueued_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, user_email, plan, json.dumps(payload, separators=(",", ":")), now),
+            )
+        return self.placement(job_id)
+
+    def lease(self, owner: str, lease_seconds: float) -> Optional[LeasedJob]:
+        with self._write() as conn:
+            now = time.time()
+            rows = self._rows(conn)
+            running = {plan: 0 for plan in PLAN_WEIGHTS}
+            for row in rows:
+                if _leased(row, now):
+                    running[row["plan"]] += 1
+            total = sum(running.values())
+            if total >= self.capacity:
+                return None
+            passes = self._passes(conn)
+            queues = self._ready_queues(conn, rows, now)
+            allow_non_pro = total - running["pro"] < self.capacity - self.reserved_pro
+            plan = pick_plan(passes, queues, allow_non_pro)
+            if plan is None:
+                return None
+            row = pop_next(plan, passes, queues)
+            conn.execute(
+                "UPDATE job_queue SET lease_owner = ?, lease_expires = ?, attempts = attempts + 1 WHERE job_id = ?",
+                (owner, now + lease_seconds, row["job_id"]),
+            )
+            turn = self._bump(conn, "dispatched", 1)
+            self._set(conn, f"pass:{plan}", passes[plan])
+            self._set(conn, f"turn:{row['user_email']}", turn)
+            waited = now - row["enqueued_at"] if not row["attempts"] else 0.0
+            if not row["attempts"]:
+                self._ewma(conn, "avg_wait", waited)
+            return LeasedJob(
+                job_id=row["job_id"],
+                user_email=row["user_email"],
+                plan=row["plan"],
+                payload=json.loads(row["payload"]),
+                attempts=row["attempts"] + 1,
+                waited=waited,
+            )
+
+    def heartbeat(self, job_id: str, owner: str, lease_seconds: float) -> bool:
+        with self._write() as conn:
+            cur = conn.execute(
+                "UPDATE job_queue SET lease_expires = ? WHERE job_id = ? AND lease_owner = ?",
+                (time.time() + lease_seconds, job_id, owner),
+            )
+            return cur.rowcount > 0
+
+    def complete(self, job_id: str, owner: str, runtime: Optional[float] = None) -> None:
+        with self._write() as conn:
+            row = conn.execute("SELECT user_email FROM job_queue WHERE job_id = ? AND lease_owner = ?", (job_id, owner)).fetchone()
+            if row is None:
+                return
+            conn.execute("DELETE FROM job_queue WHERE job_id = ?", (job_id,))
+            if runtime is not None:
+                self._ewma(conn, "avg_runtime", runtime)
+            if conn.execute("SELECT 1 FROM job_queue WHERE user_email = ? LIMIT 1", (row["user_email"],)).fetchone() is None:
+                conn.execute("DELETE FROM job_queue_state WHERE key = ?", (f"turn:{row['user_email']}",))
+
+    def cancel(self, job_id: str) -> bool:
+        """Drop a job no worker has leased yet; False once one has, even if that lease expired."""
+        with self._write() as conn:
+            row = conn.execute("SELECT user_email, attempts FROM job_queue WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None or row["attempts"]:
+                return False
+            conn.execute("DELETE FROM job_queue WHERE job_id = ?", (job_id,))
+            if conn.execute("SELECT 1 FROM job_queue WHERE user_email = ? LIMIT 1", (row["user_email"],)).fetchone() is None:
+                conn.execute("DELETE FROM job_queue_state WHERE key = ?", (f"turn:{row['user_email']}",))
+            return True
+
+    def accepting(self) -> bool:
+        now = time.time()
+        return sum(1 for row in self._rows(self._conn()) if not _leased(row, now)) < self.max_depth
+
+    def placement(self, job_id: str) -> Optional[Dict]:
+        conn = self._conn()
+        now = time.time()
+        rows = self._rows(conn)
+        running = sum(1 for row in rows if _leased(row, now))
+        passes = self._passes(conn)
+        queues = self._ready_queues(conn, rows, now)
+        position = 0
+        while True:
+            plan = pick_plan(passes, queues, allow_non_pro=True)
+            if plan is None:
+                return None
+            if pop_next(plan, passes, queues)["job_id"] == job_id:
+                return placement_for(position, running, self.capacity, self._get(conn, "avg_runtime", 60.0))
+            position += 1
+
+    def stats(self) -> Dict:
+        conn = self._conn()
+        now = time.time()
+        rows = self._rows(conn)
+        ready = [row for row in rows if not _leased(row, now)]
+        leased = [row for row in rows if _leased(row, now)]
+        oldest = min((row["enqueued_at"] for row in ready), default=None)
+        return {
+            "depth": len(ready),
+            "max_depth": self.max_depth,
+            "depth_by_plan": {plan: sum(1 for row in ready if row["plan"] == plan) for plan in PLAN_WEIGHTS},
+            "running": len(leased),
+            "running_by_plan": {plan: sum(1 for row in leased if row["plan"] == plan) for plan in PLAN_WEIGHTS},
+            "workers": self.capacity,
+            "reserved_pro": self.reserved_pro,
+            "dispatched": int(self._get(conn, "dispatched", 0)),
+            "rejected": int(self._get(conn, "rejected", 0)),
+            "avg_wait_seconds": round(self._get(conn, "avg_wait", 0.0), 3),
+            "oldest_wait_seconds": round(now - oldest, 3) if oldest is not None else 0.0,
+            "avg_runtime_seconds": round(self._get(conn, "avg_runtime", 60.0), 3),
+        }
+
+    def _ready_queues(self, conn: sqlite3.Connection, rows: List[sqlite3.Row], now: float) -> Dict:
+        turns = {
+            row["key"][5:]: row["value"]
+            for row in conn.execute("SELECT key, value FROM job_queue_state WHERE key LIKE 'turn:%'")
+        }
+        by_user: Dict[str, List[sqlite3.Row]] = {}
+        for row in rows:
+            if not _leased(row, now):
+                by_user.setdefault(row["user_email"], []).append(row)
+        # Users who waited longest since their last dispatch go first, mirroring the in-process rotation.
+        ordered = sorted(by_user.items(), key=lambda item: (turns.get(item[0], 0.0), item[1][0]["enqueued_at"]))
+        queues: Dict[str, OrderedDict] = {plan: OrderedDict() for plan in PLAN_WEIGHTS}
+        for user, user_rows in ordered:
+            for row in user_rows:
+                queues[row["plan"]].setdefault(user, deque()).append(row)
+        return queues
+
+    def _rows(self, conn: sqlite3.Connection) -> List[sqlite3.Row]:
+        return conn.execute("SELECT * FROM job_queue ORDER BY enqueued_at").fetchall()
+
+    def _passes(self, conn: sqlite3.Connection) -> Dict[str, float]:
+        return {plan: self._get(conn, f"pass:{plan}", 0.0) for plan in PLAN_WEIGHTS}
+
+    def _get(self, conn: sqlite3.Connection, key: str, default: float) -> float:
+        row = conn.execute("SELECT value FROM job_queue_state WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row is not None else default
+
+    def _set(self, conn: sqlite3.Connection, key: str, value: float) -> None:
+        conn.execute(
+            "INSERT INTO job_queue_state (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+    def _bump(self, conn: sqlite3.Connection, key: str, amount: float) -> float:
+        value = self._get(conn, key, 0.0) + amount
+        self._set(conn, key, value)
+        return value
+
+    def _ewma(self, conn: sqlite3.Connection, key: str, sample: float) -> None:
+        current = self._get(conn, key, sample)
+        self._set(conn, key, current + _EWMA_ALPHA * (sample - current))
+
+    @contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers never lease the same row.
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+
+def _leased(row: sqlite3.Row, now: float) -> bool:
+    return row["lease_owner"] is not None and row["lease_expires"] is not None and row["lease_expires"] >= now
+
+
+def open_job_queue() -> SqliteJobQueue:
+    return SqliteJobQueue(
+        job_db_path(),
+        max_depth=settings.queue_max_depth,
+        capacity=settings.job_workers,
+        reserved_pro=settings.job_reserved_pro,
+    )
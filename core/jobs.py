@@ -4,10 +4,15 @@ import threading
 import uuid
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Dict, Optional
+from pathlib import Path
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, Field
 
+from core.config import settings
+from core.events import job_events
+from core.storage import STORAGE_DIR
+
 
 class JobRequest(BaseModel):
     prompt: str = ""
@@ -32,45 +37,108 @@ class JobStatus(BaseModel):
     created_at: datetime
     updated_at: datetime
     result_path: Optional[str] = None
+    preview_path: Optional[str] = None
     report: dict = Field(default_factory=dict)
     retention_expires_at: Optional[datetime] = None
+    audio_sha256: Optional[str] = None
+    version: int = 0
+
+
+JOB_FIELDS = tuple(name for name in JobStatus.model_fields if name != "version")
+MUTABLE_JOB_FIELDS = frozenset(JOB_FIELDS) - {"id", "user_email", "created_at"}
+
+
+class _JobRecord:
+    __slots__ = (*JOB_FIELDS, "version", "snapshot")
+
+    def __init__(self, **fields) -> None:
+        for name in JOB_FIELDS:
+            setattr(self, name, fields.get(name))
+        self.version = 1
+        self.snapshot: Optional[JobStatus] = None
+
+    def to_status(self) -> JobStatus:
+        # Built without re-validation; report dicts are replaced wholesale, never mutated once stored.
+        if self.snapshot is None or self.snapshot.version != self.version:
+            values = {name: getattr(self, name) for name in JOB_FIELDS}
+            self.snapshot = JobStatus.model_construct(**values, version=self.version)
+        return self.snapshot
 
 
 class JobStore:
-    def __init__(self) -> None:
-        self._jobs: Dict[str, JobStatus] = {}
-        self._lock = threading.Lock()
+    def __init__(self, stripes: int = 32) -> None:
+        self._jobs: Dict[str, _JobRecord] = {}
+        self._stripes = [threading.Lock() for _ in range(stripes)]
 
-    def create(self, session: UserSession) -> JobStatus:
+    def create(self, session: UserSession, audio_sha256: Optional[str] = None) -> JobStatus:
         job_id = str(uuid.uuid4())
         now = datetime.utcnow()
-        job = JobStatus(
+        record = _JobRecord(
             id=job_id,
             user_email=session.email,
             plan=session.plan,
             status="queued",
+            progress=0.0,
+            message="",
             created_at=now,
             updated_at=now,
+            report={},
+            audio_sha256=audio_sha256,
         )
-        with self._lock:
-            self._jobs[job_id] = job
-        return job
+        with self._lock_for(job_id):
+            self._jobs[job_id] = record
+            return record.to_status()
 
     def get(self, job_id: str) -> Optional[JobStatus]:
-        with self._lock:
-            return self._jobs.get(job_id)
-
-    def update(self, job_id: str, **updates) -> Optional[JobStatus]:
-        with self._lock:
-            current = self._jobs.get(job_id)
-            if not current:
-                return None
-            payload = current.model_dump()
-            payload.update(updates)
-            payload["updated_at"] = datetime.utcnow()
-            new_status = JobStatus(**payload)
-            self._jobs[job_id] = new_status
-            return new_status
-
-
-store = JobStore()
+        record = self._jobs.get(job_id)
+        if record is None:
+            return None
+        with self._lock_for(job_id):
+            return record.to_status()
+
+    def version(self, job_id: str) -> Optional[int]:
+        record = self._jobs.get(job_id)
+        return record.version if record is not None else None
+
+    def update(self, job_id: str, **updates) -> Optional[int]:
+        record = self._jobs.get(job_id)
+        if record is None:
+            return None
+        unknown = set(updates) - MUTABLE_JOB_FIELDS
+        if unknown:
+            raise ValueError(f"unknown job fields: {sorted(unknown)}")
+        with self._lock_for(job_id):
+            for name, value in updates.items():
+                setattr(record, name, value)
+            record.updated_at = datetime.utcnow()
+            record.version += 1
+            version = record.version
+        job_events.publish(job_id)
+        return version
+
+    def list_for_user(self, email: str, status: Optional[str] = None, limit: int = 50) -> List[JobStatus]:
+        matches = []
+        for record in list(self._jobs.values()):
+            if record.user_email == email and (status is None or record.status == status):
+                matches.append(record)
+        matches.sort(key=lambda record: record.created_at, reverse=True)
+        return [self.get(record.id) for record in matches[:limit]]
+
+    def _lock_for(self, job_id: str) -> threading.Lock:
+        return self._stripes[hash(job_id) % len(self._stripes)]
+
+
+def job_db_path() -> Path:
+    return Path(settings.job_db_path) if settings.job_db_path else STORAGE_DIR / "jobs.sqlite3"
+
+
+def _build_store():
+    # Both backends expose create/get/version/update/list_for_user.
+    if settings.job_store == "sqlite":
+        from core.sqlite_jobs import SqliteJobStore
+
+        return SqliteJobStore(job_db_path())
+    return JobStore()
+
+
+store = _build_store()
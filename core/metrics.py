@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+SECONDS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+BYTES_BUCKETS = tuple(float(2**power) for power in range(22, 34))  # 4 MiB .. 8 GiB
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = SECONDS_BUCKETS) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (not cumulative) plus +Inf, then sum.
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+        for key, counts, total in sorted(snapshot):
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{_labels([*labels, ('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {total:.6f}")
+            lines.append(f"{self.name}_count{_labels(labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Prometheus text exposition for this process: histograms plus collectors read at scrape time."""
+
+    def __init__(self) -> None:
+        self._histograms: List[Histogram] = []
+        self._collectors: List[Callable[[], List[str]]] = []
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = SECONDS_BUCKETS) -> Histogram:
+        histogram = Histogram(name, help_text, labelnames, buckets)
+        self._histograms.append(histogram)
+        return histogram
+
+    def collector(self, fn: Callable[[], List[str]]) -> Callable[[], List[str]]:
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for histogram in self._histograms:
+            lines.extend(histogram.render())
+        for collect in self._collectors:
+            lines.extend(collect())
+        return "\n".join(lines) + "\n"
+
+
+def gauge(name: str, help_text: str, samples: Dict[Tuple[Tuple[str, str], ...], float], kind: str = "gauge") -> List[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples.items():
+        lines.append(f"{name}{_labels(list(labels))} {value:g}")
+    return lines
+
+
+def _labels(pairs: List[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    escaped = (f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for name, value in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+registry = MetricsRegistry()
+STAGE_SECONDS = registry.histogram("tunivo_stage_seconds", "Wall time per pipeline stage.", ("stage",))
+STAGE_CPU_SECONDS = registry.histogram(
+    "tunivo_stage_cpu_seconds", "CPU per pipeline stage, Python threads plus subprocesses.", ("stage",)
+)
+SUBPROCESS_SECONDS = registry.histogram("tunivo_subprocess_seconds", "Wall time per ffmpeg/ffprobe run.", ("kind",))
+SUBPROCESS_CPU_SECONDS = registry.histogram("tunivo_subprocess_cpu_seconds", "User+system CPU per ffmpeg/ffprobe run.", ("kind",))
+SUBPROCESS_MAX_RSS_BYTES = registry.histogram(
+    "tunivo_subprocess_max_rss_bytes", "Peak RSS per ffmpeg/ffprobe run.", ("kind",), BYTES_BUCKETS
+)
+JOB_SECONDS = registry.histogram("tunivo_job_seconds", "Wall time per job from start to finish.", ("mode", "status"))
+
+
+class JobUsage:
+    """Stage timings and subprocess usage for one run_job call, returned as report["resources"]."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, float]] = {}
+        self._subprocesses: Dict[str, Dict[str, float]] = {}
+
+    def add_stage(self, name: str, wall: float, cpu: float) -> float:
+        with self._lock:
+            entry = self._entry(name)
+            entry["wall_s"] += wall
+            entry["cpu_s"] += cpu
+            return entry["cpu_s"] + entry["subprocess_cpu_s"]
+
+    def add_cpu(self, name: str, cpu: float) -> None:
+        with self._lock:
+            self._entry(name)["cpu_s"] += cpu
+
+    def add_subprocess(self, name: Optional[str], kind: str, wall: float, cpu: float, max_rss: float) -> None:
+        with self._lock:
+            if name is not None:
+                entry = self._entry(name)
+                entry["subprocess_cpu_s"] += cpu
+                entry["subprocesses"] += 1
+            proc = self._subprocesses.setdefault(kind, {"count": 0, "wall_s": 0.0, "cpu_s": 0.0, "max_rss_mb": 0.0})
+            proc["count"] += 1
+            proc["wall_s"] += wall
+            proc["cpu_s"] += cpu
+            proc["max_rss_mb"] = max(proc["max_rss_mb"], max_rss / (1024 * 1024))
+
+    def report(self) -> Dict:
+        with self._lock:
+            return {
+                "stages": {name: _rounded(entry) for name, entry in self._stages.items()},
+                "subprocesses": {kind: _rounded(entry) for kind, entry in self._subprocesses.items()},
+            }
+
+    def _entry(self, name: str) -> Dict[str, float]:
+        return self._stages.setdefault(name, {"wall_s": 0.0, "cpu_s": 0.0, "subprocess_cpu_s": 0.0, "subprocesses": 0})
+
+
+_usage: contextvars.ContextVar[Optional[JobUsage]] = contextvars.ContextVar("tunivo_job_usage", default=None)
+_stage: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("tunivo_stage", default=None)
+
+
+@contextmanager
+def job_usage() -> Iterator[JobUsage]:
+    usage = JobUsage()
+    token = _usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    token = _stage.set(name)
+    wall_started = time.perf_counter()
+    cpu_started = time.thread_time()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - wall_started
+        cpu = time.thread_time() - cpu_started
+        _stage.reset(token)
+        usage = _usage.get()
+        total_cpu = usage.add_stage(name, wall, cpu) if usage is not None else cpu
+        STAGE_SECONDS.observe(wall, stage=name)
+        STAGE_CPU_SECONDS.observe(total_cpu, stage=name)
+
+
+def carry_context(fn: Callable) -> Callable:
+    """Bind fn to a copy of the caller's context so pool threads report into the same job and stage.
+
+    Call once per submitted task: a context copy cannot be entered by two threads at once.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.run(_timed_task, fn, args, kwargs)
+
+    return run
+
+
+def _timed_task(fn: Callable, args: tuple, kwargs: dict):
+    started = time.thread_time()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        usage = _usage.get()
+        name = _stage.get()
+        if usage is not None and name is not None:
+            usage.add_cpu(name, time.thread_time() - started)
+
+
+def record_subprocess(kind: str, wall: float, cpu: float, max_rss: float) -> None:
+    SUBPROCESS_SECONDS.observe(wall, kind=kind)
+    SUBPROCESS_CPU_SECONDS.observe(cpu, kind=kind)
+    SUBPROCESS_MAX_RSS_BYTES.observe(max_rss, kind=kind)
+    usage = _usage.get()
+    if usage is not None:
+        usage.add_subprocess(_stage.get(), kind, wall, cpu, max_rss)
+
+
+def _rounded(entry: Dict[str, float]) -> Dict[str, float]:
+    return {key: round(value, 3) if isinstance(value, float) else value for key, value in entry.items()}
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import contextvars
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Set
+
+from core.metrics import record_subprocess
+
+
+class JobCancelled(RuntimeError):
+    pass
+
+
+class CancelScope:
+    """Cancellation state for one running job: a flag plus the subprocesses to kill when it is set.
+
+    Child scopes (see task_scope) are cancelled along with their parent.
+    """
+
+    def __init__(self, job_id: str) -> None:
+        self.job_id = job_id
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._procs: Set[subprocess.Popen] = set()
+        self._children: Set[CancelScope] = set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        with self._lock:
+            self._event.set()
+            procs = list(self._procs)
+            children = list(self._children)
+        for child in children:
+            child.cancel()
+        for proc in procs:
+            # ffmpeg output of a cancelled job is discarded, so there is no trailer worth waiting for.
+            if proc.poll() is None:
+                proc.kill()
+
+    def check(self) -> None:
+        if self._event.is_set():
+            raise JobCancelled("cancelled")
+
+    def track(self, proc: subprocess.Popen) -> None:
+        with self._lock:
+            if not self._event.is_set():
+                self._procs.add(proc)
+                return
+        proc.kill()
+
+    def untrack(self, proc: subprocess.Popen) -> None:
+        with self._lock:
+            self._procs.discard(proc)
+
+    def adopt(self, child: CancelScope) -> None:
+        with self._lock:
+            if not self._event.is_set():
+                self._children.add(child)
+                return
+        child.cancel()
+
+    def disown(self, child: CancelScope) -> None:
+        with self._lock:
+            self._children.discard(child)
+
+
+_scope: contextvars.ContextVar[Optional[CancelScope]] = contextvars.ContextVar("tunivo_cancel_scope", default=None)
+_scopes: Dict[str, CancelScope] = {}
+_scopes_lock = threading.Lock()
+
+
+@contextmanager
+def cancel_scope(job_id: str, requested: Callable[[], bool], poll_seconds: float) -> Iterator[CancelScope]:
+    """Run a job under a CancelScope that is cancelled once requested() turns true.
+
+    requested() is polled on a watcher thread, so a request from another process (or a worker
+    blocked in a long ffmpeg run) is seen within poll_seconds; cancel_running() is immediate for
+    jobs running in this process.
+    """
+    scope = CancelScope(job_id)
+    done = threading.Event()
+
+    def watch() -> None:
+        while not scope.cancelled:
+            if requested():
+                scope.cancel()
+                return
+            if done.wait(poll_seconds):
+                return
+
+    with _scopes_lock:
+        _scopes[job_id] = scope
+    token = _scope.set(scope)
+    watcher = threading.Thread(target=watch, name=f"cancel-watch-{job_id[:8]}", daemon=True)
+    watcher.start()
+    try:
+        yield scope
+    finally:
+        done.set()
+        _scope.reset(token)
+        with _scopes_lock:
+            if _scopes.get(job_id) is scope:
+                del _scopes[job_id]
+
+
+@contextmanager
+def task_scope() -> Iterator[CancelScope]:
+    """A CancelScope for one group of tasks inside the current job.
+
+    Cancelling it stops only the group's subprocesses (e.g. the siblings of a failed task),
+    while cancelling the job still reaches them. Threads pick it up through carry_context.
+    """
+    parent = _scope.get()
+    scope = CancelScope(parent.job_id if parent is not None else "")
+    if parent is not None:
+        parent.adopt(scope)
+    token = _scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _scope.reset(token)
+        if parent is not None:
+            parent.disown(scope)
+
+
+def cancel_running(job_id: str) -> bool:
+    with _scopes_lock:
+        scope = _scopes.get(job_id)
+    if scope is None:
+        return False
+    scope.cancel()
+    return True
+
+
+def check_cancelled() -> None:
+    scope = _scope.get()
+    if scope is not None:
+        scope.check()
+
+
+def track_process(proc: subprocess.Popen) -> None:
+    """Kill proc if the current job is cancelled; wait_process() stops tracking it."""
+    scope = _scope.get()
+    if scope is not None:
+        scope.track(proc)
+
+
+def run_process(cmd: list[str], kind: str) -> subprocess.CompletedProcess:
+    """subprocess.run(cmd, capture_output=True, text=True) that also records the child's rusage.
+
+    Output goes to temporary files rather than pipes, so the child can be reaped with wait4
+    without a reader thread.
+    """
+    check_cancelled()
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        started = time.perf_counter()
+        proc = subprocess.Popen(cmd, stdout=out, stderr=err)
+        track_process(proc)
+        returncode = wait_process(proc, kind, started)
+        out.seek(0)
+        err.seek(0)
+        return subprocess.CompletedProcess(
+            cmd,
+            returncode,
+            out.read().decode("utf-8", errors="replace"),
+            err.read().decode("utf-8", errors="replace"),
+        )
+
+
+def wait_process(proc: subprocess.Popen, kind: str, started: float) -> int:
+    """Reap proc with wait4 so its own CPU and peak RSS are known, not the process-wide children total.
+
+    Raises JobCancelled if the current job was cancelled while proc ran.
+    """
+    try:
+        _, status, usage = os.wait4(proc.pid, 0)
+    except ChildProcessError:
+        proc.wait()
+    else:
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        # ru_maxrss is in KiB on Linux.
+        record_subprocess(kind, time.perf_counter() - started, usage.ru_utime + usage.ru_stime, usage.ru_maxrss * 1024.0)
+    scope = _scope.get()
+    if scope is not None:
+        scope.untrack(proc)
+        scope.check()
+    return proc.returncode
@@ -1,5 +1,209 @@
 from __future__ import annotations
 
-from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, Optional, Tuple
 
-executor = ThreadPoolExecutor(max_workers=2)
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Share of dispatches each plan gets while several plans have work queued.
+PLAN_WEIGHTS = {"pro": 4, "creator": 2, "free": 1}
+_EWMA_ALPHA = 0.2
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+@dataclass
+class QueuedJob:
+    job_id: str
+    user_email: str
+    plan: str
+    fn: Callable
+    args: Tuple
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class FairScheduler:
+    """Job dispatcher with weighted plan priority, per-user round-robin and reserved pro workers.
+
+    Plans are picked by stride scheduling (lowest pass value wins, each dispatch advances the
+    plan by 1/weight), so free jobs keep moving while pro work is queued. Within a plan, users
+    take turns one job at a time, so one user's backlog cannot delay another's next job.
+    """
+
+    def __init__(self, workers: int, reserved_pro: int, max_depth: int, initial_runtime: float = 60.0) -> None:
+        self.workers = max(1, workers)
+        self.reserved_pro = min(max(0, reserved_pro), self.workers - 1)
+        self.max_depth = max(1, max_depth)
+        self._cond = threading.Condition()
+        self._queues: Dict[str, "OrderedDict[str, Deque[QueuedJob]]"] = {plan: OrderedDict() for plan in PLAN_WEIGHTS}
+        self._pass: Dict[str, float] = {plan: 0.0 for plan in PLAN_WEIGHTS}
+        self._depth = 0
+        self._running: Dict[str, int] = {plan: 0 for plan in PLAN_WEIGHTS}
+        self._threads: List[threading.Thread] = []
+        self._avg_runtime = initial_runtime
+        self._avg_wait = 0.0
+        self._dispatched = 0
+        self._rejected = 0
+
+    def submit(self, job_id: str, user_email: str, plan: str, fn: Callable, *args) -> Dict:
+        plan = plan if plan in PLAN_WEIGHTS else "free"
+        with self._cond:
+            if self._depth >= self.max_depth:
+                self._rejected += 1
+                raise QueueFullError("queue_full")
+            self._start_workers()
+            queues = self._queues[plan]
+            if not queues:
+                # A plan returning from idle starts level with the busiest plan instead of
+                # cashing in the dispatches it skipped while empty.
+                active = [self._pass[p] for p, q in self._queues.items() if q]
+                if active:
+                    self._pass[plan] = max(self._pass[plan], min(active))
+            queues.setdefault(user_email, deque()).append(QueuedJob(job_id, user_email, plan, fn, args))
+            self._depth += 1
+            self._cond.notify()
+            return self._placement(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Drop a job that has not been dispatched yet; False once a worker has taken it."""
+        with self._cond:
+            for queues in self._queues.values():
+                for user, dq in queues.items():
+                    for queued in dq:
+                        if queued.job_id == job_id:
+                            dq.remove(queued)
+                            if not dq:
+                                del queues[user]
+                            self._depth -= 1
+                            return True
+        return False
+
+    def accepting(self) -> bool:
+        with self._cond:
+            return self._depth < self.max_depth
+
+    def placement(self, job_id: str) -> Optional[Dict]:
+        """Queue position (jobs dispatched before this one) and a rough ETA, or None once dispatched."""
+        with self._cond:
+            return self._placement(job_id)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            now = time.monotonic()
+            oldest = min(
+                (dq[0].enqueued_at for queues in self._queues.values() for dq in queues.values()),
+                default=None,
+            )
+            return {
+                "depth": self._depth,
+                "max_depth": self.max_depth,
+                "depth_by_plan": {plan: sum(len(dq) for dq in q.values()) for plan, q in self._queues.items()},
+                "running": sum(self._running.values()),
+                "running_by_plan": dict(self._running),
+                "workers": self.workers,
+                "reserved_pro": self.reserved_pro,
+                "dispatched": self._dispatched,
+                "rejected": self._rejected,
+                "avg_wait_seconds": round(self._avg_wait, 3),
+                "oldest_wait_seconds": round(now - oldest, 3) if oldest is not None else 0.0,
+                "avg_runtime_seconds": round(self._avg_runtime, 3),
+            }
+
+    def _placement(self, job_id: str) -> Optional[Dict]:
+        for position, queued in enumerate(self._dispatch_order()):
+            if queued.job_id == job_id:
+                return placement_for(position, sum(self._running.values()), self.workers, self._avg_runtime)
+        return None
+
+    def _dispatch_order(self) -> List[QueuedJob]:
+        # Replays _next() on a copy; worker reservations are ignored, which only matters for ETAs.
+        passes = dict(self._pass)
+        queues = {plan: OrderedDict((user, deque(dq)) for user, dq in q.items()) for plan, q in self._queues.items()}
+        order = []
+        while True:
+            plan = pick_plan(passes, queues, allow_non_pro=True)
+            if plan is None:
+                return order
+            order.append(pop_next(plan, passes, queues))
+
+    def _next(self) -> Optional[QueuedJob]:
+        running = sum(self._running.values())
+        if running >= self.workers:
+            return None
+        allow_non_pro = running - self._running["pro"] < self.workers - self.reserved_pro
+        plan = pick_plan(self._pass, self._queues, allow_non_pro)
+        if plan is None:
+            return None
+        self._depth -= 1
+        return pop_next(plan, self._pass, self._queues)
+
+    def _start_workers(self) -> None:
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f"job-worker-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                queued = self._next()
+                while queued is None:
+                    self._cond.wait()
+                    queued = self._next()
+                self._running[queued.plan] += 1
+                self._dispatched += 1
+                waited = time.monotonic() - queued.enqueued_at
+                self._avg_wait += _EWMA_ALPHA * (waited - self._avg_wait)
+            started = time.monotonic()
+            try:
+                queued.fn(*queued.args)
+            except Exception:
+                logger.exception("job %s crashed outside the pipeline", queued.job_id)
+            finally:
+                with self._cond:
+                    self._running[queued.plan] -= 1
+                    self._avg_runtime += _EWMA_ALPHA * (time.monotonic() - started - self._avg_runtime)
+                    # A finished pro job may unblock a non-pro job another worker is parked on.
+                    self._cond.notify_all()
+
+
+def pick_plan(passes: Dict[str, float], queues: Dict, allow_non_pro: bool) -> Optional[str]:
+    candidates = [plan for plan, q in queues.items() if q and (allow_non_pro or plan == "pro")]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda plan: (passes[plan], -PLAN_WEIGHTS[plan]))
+
+
+def pop_next(plan: str, passes: Dict[str, float], queues: Dict):
+    """Take the head job of the plan's next user in turn and advance the plan's pass."""
+    users = queues[plan]
+    user, dq = next(iter(users.items()))
+    queued = dq.popleft()
+    if dq:
+        users.move_to_end(user)
+    else:
+        del users[user]
+    passes[plan] += 1.0 / PLAN_WEIGHTS[plan]
+    return queued
+
+
+def placement_for(position: int, running: int, workers: int, avg_runtime: float) -> Dict:
+    # Running jobs are on average half done; queued ones need a full run each.
+    busy = running + position >= workers
+    eta = avg_runtime * (position + 0.5 * running) / workers if busy else 0.0
+    return {"queue_position": position, "eta_seconds": round(eta, 1)}
+
+
+scheduler = FairScheduler(
+    workers=settings.job_workers,
+    reserved_pro=settings.job_reserved_pro,
+    max_depth=settings.queue_max_depth,
+)
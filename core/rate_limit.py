@@ -1,25 +1,124 @@
 from __future__ import annotations
 
+import sqlite3
 import threading
 import time
-from collections import defaultdict, deque
+from pathlib import Path
+from typing import Dict
 
+from core.config import settings
+from core.storage import STORAGE_DIR
 
-class SlidingWindowLimiter:
-    def __init__(self, max_events: int, window_seconds: int = 60) -> None:
-        self.max_events = max_events
+# Opportunistic eviction runs once per this many allow() calls (per stripe / per connection).
+_SWEEP_EVERY = 1024
+
+
+class GcraLimiter:
+    """Generic cell rate algorithm: max_events per window, smoothed, one float per active key.
+
+    Each key stores its theoretical arrival time (TAT). A request is allowed while the TAT is
+    less than `window - interval` ahead of now; allowing it pushes the TAT by one interval.
+    A key whose TAT has passed carries no state, so it is evicted.
+    """
+
+    def __init__(self, max_events: int, window_seconds: float = 60, stripes: int = 16) -> None:
+        self.max_events = max(1, max_events)
         self.window_seconds = window_seconds
-        self._events: dict[str, deque[float]] = defaultdict(deque)
-        self._lock = threading.Lock()
+        self.interval = window_seconds / self.max_events
+        self.tolerance = window_seconds - self.interval
+        self._tats: list[Dict[str, float]] = [{} for _ in range(stripes)]
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._calls = [0] * stripes
+        self.allowed = 0
+        self.rejected = 0
 
     def allow(self, key: str) -> bool:
-        now = time.time()
-        cutoff = now - self.window_seconds
-        with self._lock:
-            q = self._events[key]
-            while q and q[0] < cutoff:
-                q.popleft()
-            if len(q) >= self.max_events:
+        now = time.monotonic()
+        stripe = hash(key) % len(self._locks)
+        tats = self._tats[stripe]
+        with self._locks[stripe]:
+            self._calls[stripe] += 1
+            if self._calls[stripe] % _SWEEP_EVERY == 0:
+                for stale in [k for k, tat in tats.items() if tat <= now]:
+                    del tats[stale]
+            tat = max(tats.get(key, now), now)
+            if tat - now > self.tolerance:
+                self.rejected += 1
                 return False
-            q.append(now)
+            tats[key] = tat + self.interval
+            self.allowed += 1
             return True
+
+    def stats(self) -> Dict:
+        return {
+            "backend": "memory",
+            "keys": sum(len(tats) for tats in self._tats),
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+        }
+
+
+class SqliteGcraLimiter:
+    """GCRA with the TAT table in a SQLite file, so every API process on the host shares one limit.
+
+    The check-and-advance is a single UPSERT ... RETURNING statement, which SQLite applies
+    atomically; a rejected request matches no row and returns nothing.
+    """
+
+    def __init__(self, path: Path, max_events: int, window_seconds: float = 60) -> None:
+        self.path = path
+        self.max_events = max(1, max_events)
+        self.window_seconds = window_seconds
+        self.interval = window_seconds / self.max_events
+        self.tolerance = window_seconds - self.interval
+        self._local = threading.local()
+        self.allowed = 0
+        self.rejected = 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn().execute("CREATE TABLE IF NOT EXISTS rate_limit (key TEXT PRIMARY KEY, tat REAL NOT NULL) WITHOUT ROWID")
+
+    def allow(self, key: str) -> bool:
+        # Wall clock, not monotonic: TATs are compared across processes.
+        now = time.time()
+        conn = self._conn()
+        self._local.calls += 1
+        if self._local.calls % _SWEEP_EVERY == 0:
+            conn.execute("DELETE FROM rate_limit WHERE tat <= ?", (now,))
+        row = conn.execute(
+            """
+            INSERT INTO rate_limit (key, tat) VALUES (?1, ?2 + ?3)
+            ON CONFLICT (key) DO UPDATE SET tat = max(tat, ?2) + ?3
+            WHERE max(tat, ?2) - ?2 <= ?4
+            RETURNING tat
+            """,
+            (key, now, self.interval, self.tolerance),
+        ).fetchone()
+        if row is None:
+            self.rejected += 1
+            return False
+        self.allowed += 1
+        return True
+
+    def stats(self) -> Dict:
+        keys = self._conn().execute("SELECT count(*) FROM rate_limit").fetchone()[0]
+        # allowed/rejected count this process only; the key table is shared.
+        return {"backend": "sqlite", "keys": keys, "allowed": self.allowed, "rejected": self.rejected}
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Limiter state is disposable; losing the last writes in a power cut only resets a few buckets.
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+            self._local.calls = 0
+        return conn
+
+
+def build_limiter(max_events: int, window_seconds: float = 60):
+    if settings.rate_limit_backend == "sqlite":
+        path = Path(settings.rate_limit_db_path) if settings.rate_limit_db_path else STORAGE_DIR / "ratelimit.sqlite3"
+        return SqliteGcraLimiter(path, max_events, window_seconds)
+    return GcraLimiter(max_events, window_seconds)
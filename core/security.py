@@ -7,12 +7,14 @@ import json
 import time
 
 
-def create_signed_token(job_id: str, email: str, secret: str, ttl_seconds: int = 1200) -> str:
+def create_signed_token(job_id: str, email: str, secret: str, ttl_seconds: int = 1200, scope: str | None = None) -> str:
     payload = {
         "job_id": job_id,
         "email": email,
         "exp": int(time.time() + ttl_seconds),
     }
+    if scope is not None:
+        payload["scope"] = scope
     raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
     sig = hmac.new(secret.encode("utf-8"), raw, hashlib.sha256).hexdigest()
     return f"{base64.urlsafe_b64encode(raw).decode('utf-8')}.{sig}"
@@ -0,0 +1,8 @@
+from __future__ import annotations
+
+import threading
+
+from core.config import settings
+
+# Shared across jobs so concurrent generate stages cannot oversubscribe ffmpeg.
+clip_slots = threading.BoundedSemaphore(max(1, settings.clip_global_concurrency))
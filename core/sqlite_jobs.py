@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import atexit
+import json
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from core.events import job_events
+from core.jobs import JOB_FIELDS, MUTABLE_JOB_FIELDS, JobStatus, UserSession
+
+# Updates limited to these fields are buffered and written in batches; anything else writes through.
+_BATCHED_FIELDS = frozenset({"progress", "message"})
+_JSON_FIELDS = {"report"}
+_DATETIME_FIELDS = {"created_at", "updated_at", "retention_expires_at"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    user_email TEXT NOT NULL,
+    plan TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT NOT NULL DEFAULT '',
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    result_path TEXT,
+    preview_path TEXT,
+    report TEXT NOT NULL DEFAULT '{}',
+    retention_expires_at TEXT,
+    audio_sha256 TEXT,
+    version INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS jobs_user_status ON jobs (user_email, status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, updated_at);
+"""
+# Columns added after the table first shipped; existing databases get them on open.
+_ADDED_COLUMNS = {"preview_path": "TEXT"}
+
+
+class SqliteJobStore:
+    """JobStore backend shared by every API and worker process on the host through one WAL database."""
+
+    def __init__(self, path: Path, flush_interval: float = 0.25) -> None:
+        self.path = path
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._pending: Dict[str, dict] = {}
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+        self._add_missing_columns()
+        self._flusher = threading.Thread(target=self._flush_loop, name="job-store-flush", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def create(self, session: UserSession, audio_sha256: Optional[str] = None) -> JobStatus:
+        now = datetime.utcnow()
+        values = {
+            "id": str(uuid.uuid4()),
+            "user_email": session.email,
+            "plan": session.plan,
+            "status": "queued",
+            "progress": 0.0,
+            "message": "",
+            "created_at": now,
+            "updated_at": now,
+            "result_path": None,
+            "preview_path": None,
+            "report": {},
+            "retention_expires_at": None,
+            "audio_sha256": audio_sha256,
+        }
+        columns = ", ".join(JOB_FIELDS)
+        marks = ", ".join("?" for _ in JOB_FIELDS)
+        with self._conn() as conn:
+            conn.execute(f"INSERT INTO jobs ({columns}, version) VALUES ({marks}, 1)", [_encode(k, values[k]) for k in JOB_FIELDS])
+        return JobStatus.model_construct(**values, version=1)
+
+    def get(self, job_id: str) -> Optional[JobStatus]:
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        values = {name: _decode(name, row[name]) for name in JOB_FIELDS}
+        version = row["version"]
+        with self._pending_lock:
+            pending = self._pending.get(job_id)
+            if pending is not None:
+                values.update(pending["fields"])
+                version += pending["bumps"]
+        return JobStatus.model_construct(**values, version=version)
+
+    def version(self, job_id: str) -> Optional[int]:
+        row = self._conn().execute("SELECT version FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        with self._pending_lock:
+            pending = self._pending.get(job_id)
+            return row["version"] + (pending["bumps"] if pending else 0)
+
+    def update(self, job_id: str, **updates) -> Optional[int]:
+        unknown = set(updates) - MUTABLE_JOB_FIELDS
+        if unknown:
+            raise ValueError(f"unknown job fields: {sorted(unknown)}")
+        now = datetime.utcnow()
+        if set(updates) <= _BATCHED_FIELDS:
+            version = self.version(job_id)
+            if version is None:
+                return None
+            with self._pending_lock:
+                pending = self._pending.setdefault(job_id, {"fields": {}, "bumps": 0})
+                pending["fields"].update(updates, updated_at=now)
+                pending["bumps"] += 1
+            job_events.publish(job_id)
+            return version + 1
+
+        # Serialised with flush() so a batch in flight cannot overwrite this write afterwards.
+        with self._flush_lock:
+            with self._pending_lock:
+                pending = self._pending.pop(job_id, None)
+            fields = dict(pending["fields"]) if pending else {}
+            fields.update(updates, updated_at=now)
+            bumps = (pending["bumps"] if pending else 0) + 1
+            assignments = ", ".join(f"{name} = ?" for name in fields)
+            with self._conn() as conn:
+                cur = conn.execute(
+                    f"UPDATE jobs SET {assignments}, version = version + ? WHERE id = ?",
+                    [*(_encode(k, v) for k, v in fields.items()), bumps, job_id],
+                )
+                if cur.rowcount == 0:
+                    return None
+                version = conn.execute("SELECT version FROM jobs WHERE id = ?", (job_id,)).fetchone()["version"]
+        job_events.publish(job_id)
+        return version
+
+    def list_for_user(self, email: str, status: Optional[str] = None, limit: int = 50) -> List[JobStatus]:
+        self.flush()
+        if status is None:
+            rows = self._conn().execute(
+                "SELECT * FROM jobs WHERE user_email = ? ORDER BY created_at DESC LIMIT ?", (email, limit)
+            )
+        else:
+            rows = self._conn().execute(
+                "SELECT * FROM jobs WHERE user_email = ? AND status = ? ORDER BY created_at DESC LIMIT ?",
+                (email, status, limit),
+            )
+        return [
+            JobStatus.model_construct(**{name: _decode(name, row[name]) for name in JOB_FIELDS}, version=row["version"])
+            for row in rows
+        ]
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            with self._pending_lock:
+                batch = {job_id: (dict(p["fields"]), p["bumps"]) for job_id, p in self._pending.items()}
+            if not batch:
+                return
+            with self._conn() as conn:
+                for job_id, (fields, bumps) in batch.items():
+                    assignments = ", ".join(f"{name} = ?" for name in fields)
+                    conn.execute(
+                        f"UPDATE jobs SET {assignments}, version = version + ? WHERE id = ?",
+                        [*(_encode(k, v) for k, v in fields.items()), bumps, job_id],
+                    )
+            # Entries stay visible to readers until committed, then only the flushed bumps are retired.
+            with self._pending_lock:
+                for job_id, (_, bumps) in batch.items():
+                    entry = self._pending.get(job_id)
+                    if entry is None:
+                        continue
+                    entry["bumps"] -= bumps
+                    if entry["bumps"] <= 0:
+                        del self._pending[job_id]
+
+    def close(self) -> None:
+        self._stop.set()
+        self.flush()
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error:
+                # The batch stays pending for the next tick; a locked database is transient under WAL.
+                continue
+
+    def _add_missing_columns(self) -> None:
+        with self._conn() as conn:
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for name, kind in _ADDED_COLUMNS.items():
+                if name not in existing:
+                    try:
+                        conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+                    except sqlite3.OperationalError:
+                        # Another process added it between the check and the ALTER.
+                        pass
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+
+def _encode(name: str, value):
+    if value is None:
+        return None
+    if name in _JSON_FIELDS:
+        return json.dumps(value, separators=(",", ":"), default=str)
+    if name in _DATETIME_FIELDS:
+        return value.isoformat()
+    return value
+
+
+def _decode(name: str, value):
+    if value is None:
+        return {} if name in _JSON_FIELDS else None
+    if name in _JSON_FIELDS:
+        return json.loads(value)
+    if name in _DATETIME_FIELDS:
+        return datetime.fromisoformat(value)
+    return value
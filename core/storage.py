@@ -7,7 +7,8 @@ from pathlib import Path
 from core.config import settings
 
 BASE_DIR = Path(__file__).resolve().parents[2]
-STORAGE_DIR = BASE_DIR / "storage"
+# Jobs, uploads, caches, the ledger and (unless set separately) the SQLite databases all live here.
+STORAGE_DIR = Path(settings.storage_dir) if settings.storage_dir else BASE_DIR / "storage"
 
 
 def job_dir(job_id: str) -> Path:
@@ -16,6 +17,11 @@ def job_dir(job_id: str) -> Path:
     return path
 
 
+def cancel_marker(job_id: str) -> Path:
+    # Kept in the job directory so every API and worker process sees it, and it goes away with the job.
+    return STORAGE_DIR / "jobs" / job_id / "cancel.requested"
+
+
 def schedule_retention_expiry() -> datetime:
     return datetime.utcnow() + timedelta(hours=settings.retention_hours)
 
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import hashlib
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Collection, Dict, Optional
+
+from multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
+
+from core.storage import STORAGE_DIR
+
+CHUNK_BYTES = 1024 * 1024
+# Budget for all the non-file form fields (prompt, lyrics, ...) together.
+MAX_FIELD_BYTES = 256 * 1024
+
+
+class UploadTooLargeError(ValueError):
+    pass
+
+
+class UploadFormError(ValueError):
+    pass
+
+
+@dataclass
+class StoredUpload:
+    path: Path
+    size: int
+    sha256: str
+
+
+@dataclass
+class ReceivedForm:
+    fields: Dict[str, str]
+    upload: StoredUpload
+    filename: str
+    content_type: str
+
+
+def staging_path() -> Path:
+    path = STORAGE_DIR / "uploads" / f"{uuid.uuid4().hex}.part"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+@dataclass
+class _Part:
+    headers: Dict[bytes, bytes] = field(default_factory=dict)
+    name: str = ""
+    filename: Optional[str] = None
+    content_type: str = ""
+    data: bytearray = field(default_factory=bytearray)
+
+
+async def receive_form(
+    content_type: str,
+    body: AsyncIterator[bytes],
+    file_field: str,
+    dest: Path,
+    max_bytes: int,
+    accept_types: Collection[str],
+) -> ReceivedForm:
+    """Parse a multipart/form-data body as it arrives, streaming the one file part to dest.
+
+    Oversized files and unsupported content types are rejected as soon as the bytes or part
+    headers that prove it have been read, so the rest of the body is never received.
+    """
+    ctype, options = parse_options_header(content_type)
+    boundary = options.get(b"boundary")
+    if ctype != b"multipart/form-data" or not boundary:
+        raise UploadFormError("expected multipart/form-data")
+
+    # The parser runs callbacks synchronously; they queue events that are applied between chunks.
+    events: list = []
+    header = [b"", b""]
+
+    def on_header_field(data: bytes, start: int, end: int) -> None:
+        header[0] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int) -> None:
+        header[1] += data[start:end]
+
+    def on_header_end() -> None:
+        events.append(("header", header[0].lower(), header[1]))
+        header[0] = header[1] = b""
+
+    parser = MultipartParser(
+        boundary,
+        {
+            "on_part_begin": lambda: events.append(("begin",)),
+            "on_part_data": lambda data, start, end: events.append(("data", data[start:end])),
+            "on_part_end": lambda: events.append(("end",)),
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": lambda: events.append(("headers",)),
+            "on_end": lambda: events.append(("done",)),
+        },
+    )
+
+    fields: Dict[str, str] = {}
+    field_bytes = 0
+    part = _Part()
+    received: Optional[_Part] = None
+    digest = hashlib.sha256()
+    size = 0
+    finished = False
+    f: Optional[BinaryIO] = None
+    try:
+        async for chunk in body:
+            try:
+                parser.write(chunk)
+            except Exception as exc:
+                raise UploadFormError("malformed multipart body") from exc
+            for event in events:
+                kind = event[0]
+                if kind == "begin":
+                    part = _Part()
+                elif kind == "header":
+                    part.headers[event[1]] = event[2]
+                elif kind == "headers":
+                    _, disposition = parse_options_header(part.headers.get(b"content-disposition", b""))
+                    part.name = disposition.get(b"name", b"").decode("latin-1")
+                    if b"filename" in disposition:
+                        part.filename = disposition[b"filename"].decode("latin-1")
+                        part.content_type = part.headers.get(b"content-type", b"").decode("latin-1")
+                    if part.name == file_field:
+                        if received is not None:
+                            raise UploadFormError(f"{file_field} was sent more than once")
+                        if part.filename is None:
+                            raise UploadFormError(f"{file_field} must be a file")
+                        if part.content_type not in accept_types:
+                            raise UploadFormError("unsupported audio format")
+                        received = part
+                        f = await run_in_threadpool(dest.open, "wb")
+                elif kind == "data":
+                    if part is received:
+                        size += len(event[1])
+                        if size > max_bytes:
+                            raise UploadTooLargeError("upload_too_large")
+                        part.data += event[1]
+                        # Batch the socket's small reads into CHUNK_BYTES writes on the threadpool.
+                        if len(part.data) >= CHUNK_BYTES:
+                            await run_in_threadpool(_write_chunk, f, digest, bytes(part.data))
+                            part.data.clear()
+                    else:
+                        field_bytes += len(event[1])
+                        if field_bytes > MAX_FIELD_BYTES:
+                            raise UploadTooLargeError("upload_too_large")
+                        part.data += event[1]
+                elif kind == "end":
+                    if part is received:
+                        await run_in_threadpool(_write_chunk, f, digest, bytes(part.data))
+                        part.data.clear()
+                    elif part.filename is None:
+                        fields[part.name] = part.data.decode("utf-8", errors="replace")
+                elif kind == "done":
+                    finished = True
+            events.clear()
+        if not finished:
+            raise UploadFormError("incomplete multipart body")
+        if received is None:
+            raise UploadFormError(f"{file_field} is required")
+    except BaseException:
+        if f is not None:
+            await run_in_threadpool(f.close)
+        dest.unlink(missing_ok=True)
+        raise
+    await run_in_threadpool(f.close)
+    return ReceivedForm(
+        fields=fields,
+        upload=StoredUpload(path=dest, size=size, sha256=digest.hexdigest()),
+        filename=received.filename,
+        content_type=received.content_type,
+    )
+
+
+def _write_chunk(f: BinaryIO, digest: hashlib._Hash, chunk: bytes) -> None:
+    digest.update(chunk)
+    f.write(chunk)
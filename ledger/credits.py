@@ -1,7 +1,16 @@
 from __future__ import annotations
 
+import contextlib
+import itertools
+import json
+import os
 import threading
+import uuid
 from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+_SEGMENT_PREFIX = "journal-"
 
 
 @dataclass
@@ -11,54 +20,345 @@ class CreditsReservation:
     committed: bool = False
 
 
-class CreditsLedger:
-    """In-memory ledger boundary with idempotent reserve/commit/release."""
+class _Account:
+    __slots__ = ("plan", "allowance", "spent", "held", "reservations")
 
-    def __init__(self, plan: str, allowance: int | None = None) -> None:
+    def __init__(self, plan: str, allowance: int) -> None:
         self.plan = plan
-        self.allowance = allowance or self._default_allowance(plan)
-        self._reservations: dict[str, CreditsReservation] = {}
-        self._lock = threading.Lock()
+        self.allowance = allowance
+        self.spent = 0
+        self.held = 0
+        self.reservations: Dict[str, CreditsReservation] = {}
+
+    @property
+    def available(self) -> int:
+        return self.allowance - self.spent - self.held
+
+
+class CreditsLedger:
+    """Durable per-user credits accounts with idempotent reserve/commit/release.
 
-    def estimate_cost(self, duration: float, mode: str) -> int:
+    Every state change is a JSON line in an append-only journal. A single writer thread
+    fsyncs whole batches (group commit) and callers return once their record is durable.
+    Accounts are guarded by striped locks, so operations on different users never contend
+    outside the journal append. On startup, state is the latest snapshot plus the journal
+    records after it.
+    """
+
+    def __init__(self, root: Path, stripes: int = 64, snapshot_every: int = 50000) -> None:
+        self.root = root
+        self.snapshot_every = snapshot_every
+        root.mkdir(parents=True, exist_ok=True)
+        self._accounts: Dict[str, _Account] = {}
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._snapshot_lock = threading.Lock()
+        last_seq = self._recover()
+        self._seq = itertools.count(last_seq + 1)
+        self._journal = _GroupCommitJournal(root, last_seq + 1, snapshot_every, self._snapshot_due)
+
+    @staticmethod
+    def estimate_cost(duration: float, mode: str) -> int:
         base = 4 if mode == "fast" else 10
         per_minute = 2 if mode == "fast" else 5
         return int(base + (duration / 60.0) * per_minute)
 
-    def reserve_credits(self, job_id: str, amount: int) -> CreditsReservation:
-        with self._lock:
-            existing = self._reservations.get(job_id)
-            if existing:
+    def reserve_credits(self, email: str, plan: str, job_id: str, amount: int) -> CreditsReservation:
+        with self._lock_for(email):
+            account = self._accounts.get(email)
+            existing = account.reservations.get(job_id) if account is not None else None
+            if existing is not None:
                 return existing
-            if amount > self.allowance:
+            available = account.available if account is not None else default_allowance(plan)
+            if amount > available:
                 raise ValueError("insufficient_credits")
-            reservation = CreditsReservation(job_id=job_id, amount=amount)
-            self._reservations[job_id] = reservation
-            return reservation
-
-    def commit_credits(self, job_id: str) -> CreditsReservation:
-        with self._lock:
-            reservation = self._reservations.get(job_id)
-            if not reservation:
+            record = {"op": "reserve", "email": email, "plan": plan, "job_id": job_id, "amount": amount}
+            position = self._log(record)
+            reservation = _apply(self._accounts, record)
+        self._journal.wait(position)
+        return reservation
+
+    def commit_credits(self, email: str, job_id: str) -> CreditsReservation:
+        with self._lock_for(email):
+            account = self._accounts.get(email)
+            reservation = account.reservations.get(job_id) if account is not None else None
+            if reservation is None:
                 raise ValueError("missing_reservation")
             if reservation.committed:
                 return reservation
-            self.allowance -= reservation.amount
-            reservation.committed = True
-            return reservation
-
-    def release_credits(self, job_id: str) -> None:
-        with self._lock:
-            reservation = self._reservations.get(job_id)
-            if not reservation:
+            record = {"op": "commit", "email": email, "job_id": job_id}
+            position = self._log(record)
+            _apply(self._accounts, record)
+        self._journal.wait(position)
+        return reservation
+
+    def release_credits(self, email: str, job_id: str) -> None:
+        with self._lock_for(email):
+            account = self._accounts.get(email)
+            reservation = account.reservations.get(job_id) if account is not None else None
+            if reservation is None or reservation.committed:
                 return
-            if reservation.committed:
+            record = {"op": "release", "email": email, "job_id": job_id}
+            position = self._log(record)
+            _apply(self._accounts, record)
+        self._journal.wait(position)
+
+    def balance(self, email: str, plan: str = "free") -> Dict:
+        with self._lock_for(email):
+            account = self._accounts.get(email)
+            if account is None:
+                allowance = default_allowance(plan)
+                return {"plan": plan, "allowance": allowance, "spent": 0, "reserved": 0, "available": allowance}
+            return {
+                "plan": account.plan,
+                "allowance": account.allowance,
+                "spent": account.spent,
+                "reserved": account.held,
+                "available": account.available,
+            }
+
+    def snapshot(self) -> None:
+        """Write a consistent snapshot and drop journal segments it covers."""
+        with self._snapshot_lock:
+            for lock in self._locks:
+                lock.acquire()
+            try:
+                # No stripe lock is free, so every seq handed out so far is applied.
+                covered = next(self._seq)
+                state = {email: _dump_account(account) for email, account in self._accounts.items()}
+                rotated = self._journal.rotate(covered + 1)
+            finally:
+                for lock in reversed(self._locks):
+                    lock.release()
+            self._journal.wait(rotated)
+            path = self.root / "snapshot.json"
+            tmp_path = path.with_name(f".snapshot.{uuid.uuid4().hex}.tmp")
+            with tmp_path.open("w", encoding="utf-8") as handle:
+                json.dump({"seq": covered, "accounts": state}, handle, separators=(",", ":"))
+                handle.flush()
+                os.fsync(handle.fileno())
+            os.replace(tmp_path, path)
+            _fsync_dir(self.root)
+            for start, segment in _segments(self.root):
+                if start <= covered:
+                    segment.unlink(missing_ok=True)
+
+    def close(self) -> None:
+        try:
+            self.snapshot()
+        finally:
+            self._journal.close()
+
+    def _log(self, record: Dict) -> int:
+        # Called under the account's stripe lock, so per-account journal order matches apply order.
+        return self._journal.append({"seq": next(self._seq), **record})
+
+    def _lock_for(self, email: str) -> threading.Lock:
+        return self._locks[hash(email) % len(self._locks)]
+
+    def _snapshot_due(self) -> None:
+        threading.Thread(target=self.snapshot, name="ledger-snapshot", daemon=True).start()
+
+    def _recover(self) -> int:
+        last_seq = 0
+        try:
+            snapshot = json.loads((self.root / "snapshot.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            snapshot = None
+        if snapshot is not None:
+            last_seq = snapshot["seq"]
+            for email, data in snapshot["accounts"].items():
+                self._accounts[email] = _load_account(data)
+        covered = last_seq
+        for _, segment in _segments(self.root):
+            for line in segment.read_text(encoding="utf-8").splitlines():
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn final line never returned to its caller; it is not part of the state.
+                    continue
+                if record["seq"] <= covered:
+                    continue
+                _apply(self._accounts, record)
+                last_seq = max(last_seq, record["seq"])
+        return last_seq
+
+
+class _GroupCommitJournal:
+    def __init__(self, root: Path, start_seq: int, snapshot_every: int, on_snapshot_due) -> None:
+        self.root = root
+        self._cond = threading.Condition()
+        self._pending: List = []
+        self._appended = 0
+        self._durable = 0
+        self._since_snapshot = 0
+        self._snapshot_every = snapshot_every
+        self._on_snapshot_due = on_snapshot_due
+        self._closed = False
+        self._error: Optional[BaseException] = None
+        self._file = self._open_segment(start_seq)
+        self._writer = threading.Thread(target=self._write_loop, name="ledger-journal", daemon=True)
+        self._writer.start()
+
+    def append(self, record: Dict) -> int:
+        with self._cond:
+            self._raise_if_failed()
+            self._pending.append(record)
+            self._appended += 1
+            self._cond.notify_all()
+            return self._appended
+
+    def rotate(self, start_seq: int) -> int:
+        with self._cond:
+            self._raise_if_failed()
+            self._pending.append(_Rotate(start_seq))
+            self._appended += 1
+            self._cond.notify_all()
+            return self._appended
+
+    def wait(self, position: int) -> None:
+        with self._cond:
+            while self._durable < position:
+                self._raise_if_failed()
+                self._cond.wait()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._writer.join()
+        self._file.close()
+
+    def _write_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending and self._closed:
+                    return
+                # Everything queued while the previous fsync ran goes out under one fsync.
+                batch, self._pending = self._pending, []
+            try:
+                self._write_batch(batch)
+            except BaseException as exc:
+                # ENOSPC, EIO and the like: nothing after this point is durable, so every waiter
+                # and every later append fails instead of blocking forever.
+                with self._cond:
+                    self._error = exc
+                    self._cond.notify_all()
+                with contextlib.suppress(OSError):
+                    self._file.close()
                 return
-            del self._reservations[job_id]
-
-    def _default_allowance(self, plan: str) -> int:
-        if plan == "pro":
-            return 10000
-        if plan == "creator":
-            return 1000
-        return 200
+            with self._cond:
+                self._durable += len(batch)
+                self._since_snapshot += len(batch)
+                due = self._since_snapshot >= self._snapshot_every
+                if due:
+                    self._since_snapshot = 0
+                self._cond.notify_all()
+            if due:
+                self._on_snapshot_due()
+
+    def _write_batch(self, batch: List) -> None:
+        lines = []
+        for item in batch:
+            if isinstance(item, _Rotate):
+                self._flush(lines)
+                lines = []
+                self._file.close()
+                self._file = self._open_segment(item.start_seq)
+            else:
+                lines.append(json.dumps(item, separators=(",", ":")))
+        self._flush(lines)
+
+    def _raise_if_failed(self) -> None:
+        if self._error is not None:
+            raise OSError("ledger journal is unavailable") from self._error
+
+    def _flush(self, lines: List[str]) -> None:
+        if not lines:
+            return
+        self._file.write("\n".join(lines) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _open_segment(self, start_seq: int):
+        handle = (self.root / f"{_SEGMENT_PREFIX}{start_seq:016d}.log").open("a", encoding="utf-8")
+        _fsync_dir(self.root)
+        return handle
+
+
+@dataclass
+class _Rotate:
+    start_seq: int
+
+
+def default_allowance(plan: str) -> int:
+    if plan == "pro":
+        return 10000
+    if plan == "creator":
+        return 1000
+    return 200
+
+
+def _apply(accounts: Dict[str, _Account], record: Dict) -> Optional[CreditsReservation]:
+    """Apply one journal record; shared by live operations and replay so both reach the same state."""
+    email = record["email"]
+    op = record["op"]
+    account = accounts.get(email)
+    if op == "reserve":
+        if account is None:
+            account = accounts[email] = _Account(record["plan"], default_allowance(record["plan"]))
+        existing = account.reservations.get(record["job_id"])
+        if existing is not None:
+            return existing
+        reservation = CreditsReservation(job_id=record["job_id"], amount=record["amount"])
+        account.reservations[record["job_id"]] = reservation
+        account.held += reservation.amount
+        return reservation
+    reservation = account.reservations.get(record["job_id"]) if account is not None else None
+    if reservation is None or reservation.committed:
+        return reservation
+    account.held -= reservation.amount
+    if op == "commit":
+        account.spent += reservation.amount
+        reservation.committed = True
+    elif op == "release":
+        del account.reservations[record["job_id"]]
+    return reservation
+
+
+def _dump_account(account: _Account) -> Dict:
+    return {
+        "plan": account.plan,
+        "allowance": account.allowance,
+        "spent": account.spent,
+        "reservations": {job_id: [r.amount, r.committed] for job_id, r in account.reservations.items()},
+    }
+
+
+def _load_account(data: Dict) -> _Account:
+    account = _Account(data["plan"], data["allowance"])
+    account.spent = data["spent"]
+    for job_id, (amount, committed) in data["reservations"].items():
+        account.reservations[job_id] = CreditsReservation(job_id=job_id, amount=amount, committed=committed)
+        if not committed:
+            account.held += amount
+    return account
+
+
+def _segments(root: Path) -> List[tuple]:
+    segments = []
+    for path in root.glob(f"{_SEGMENT_PREFIX}*.log"):
+        try:
+            segments.append((int(path.stem[len(_SEGMENT_PREFIX) :]), path))
+        except ValueError:
+            continue
+    return sorted(segments)
+
+
+def _fsync_dir(path: Path) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import atexit
+import fcntl
+import threading
+import time
+from multiprocessing.managers import BaseManager
+from pathlib import Path
+
+from core.config import settings
+from core.storage import STORAGE_DIR
+from ledger.credits import CreditsLedger, CreditsReservation
+
+LEDGER_DIR = STORAGE_DIR / "ledger"
+_ATTEMPTS = 3
+
+_lock = threading.Lock()
+_ledger = None
+_owner_lock_file = None
+
+
+class _LedgerManager(BaseManager):
+    pass
+
+
+def get_ledger():
+    """Return this host's credits ledger.
+
+    The first process to take the ledger directory's lock owns the journal and serves it on a
+    Unix socket; every other process (uvicorn workers, pipeline workers) gets a proxy to it.
+    """
+    global _ledger
+    with _lock:
+        if _ledger is None:
+            _ledger = _open(LEDGER_DIR)
+        return _ledger
+
+
+def _reset(stale) -> None:
+    global _ledger
+    with _lock:
+        if _ledger is stale:
+            _ledger = None
+
+
+def _open(root: Path):
+    global _owner_lock_file
+    root.mkdir(parents=True, exist_ok=True)
+    lock_file = (root / "owner.lock").open("a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return RemoteLedger(root / "ledger.sock")
+    # Held for the life of the process; the kernel drops it if the process dies.
+    _owner_lock_file = lock_file
+    ledger = CreditsLedger(root)
+    atexit.register(ledger.close)
+    _serve(ledger, root / "ledger.sock")
+    return ledger
+
+
+def _serve(ledger: CreditsLedger, address: Path) -> None:
+    address.unlink(missing_ok=True)
+    _LedgerManager.register("ledger", callable=lambda: ledger)
+    server = _LedgerManager(address=str(address), authkey=settings.hmac_secret.encode("utf-8")).get_server()
+    threading.Thread(target=server.serve_forever, name="ledger-server", daemon=True).start()
+
+
+class RemoteLedger:
+    """CreditsLedger proxy for non-owner processes.
+
+    If the owner dies mid-call, the call is retried once through a fresh get_ledger(), which
+    may make this process the new owner; reserve/commit/release are idempotent, so a retried
+    call cannot double-charge.
+    """
+
+    estimate_cost = staticmethod(CreditsLedger.estimate_cost)
+
+    def __init__(self, address: Path) -> None:
+        self.address = address
+        self._proxy = None
+        self._proxy_lock = threading.Lock()
+
+    def reserve_credits(self, email: str, plan: str, job_id: str, amount: int) -> CreditsReservation:
+        return self._call("reserve_credits", email, plan, job_id, amount)
+
+    def commit_credits(self, email: str, job_id: str) -> CreditsReservation:
+        return self._call("commit_credits", email, job_id)
+
+    def release_credits(self, email: str, job_id: str) -> None:
+        return self._call("release_credits", email, job_id)
+
+    def balance(self, email: str, plan: str = "free") -> dict:
+        return self._call("balance", email, plan)
+
+    def _call(self, method: str, *args):
+        ledger = self
+        for attempt in range(_ATTEMPTS):
+            try:
+                target = ledger._connect() if isinstance(ledger, RemoteLedger) else ledger
+                return getattr(target, method)(*args)
+            except (ConnectionError, EOFError, FileNotFoundError):
+                if attempt == _ATTEMPTS - 1:
+                    raise
+                # The owner is gone or still binding its socket; the lock decides who serves next.
+                _reset(ledger)
+                time.sleep(0.2 * (attempt + 1))
+                ledger = get_ledger()
+
+    def _connect(self):
+        with self._proxy_lock:
+            if self._proxy is None:
+                _LedgerManager.register("ledger")
+                manager = _LedgerManager(address=str(self.address), authkey=settings.hmac_secret.encode("utf-8"))
+                manager.connect()
+                self._proxy = manager.ledger()
+            return self._proxy
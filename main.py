@@ -1,35 +1,97 @@
 from __future__ import annotations
 
+import asyncio
+import json
+import os
 import shutil
 from pathlib import Path
+from typing import AsyncIterator, Optional
 
-from fastapi import FastAPI, File, Form, HTTPException, Query, Request, UploadFile
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from pydantic import ValidationError
 
+from analysis.cache import analysis_cache
 from core.auth import session_from_email
+from core.clip_cache import clip_cache
 from core.config import settings
-from core.jobs import JobRequest
+from core.events import job_events, wait_for_change
+from core.jobs import JobRequest, JobStatus, UserSession
 from core.jobs import store
-from core.queue import executor
-from core.rate_limit import SlidingWindowLimiter
+from core.metrics import gauge, registry
+from core.procs import cancel_running
+from core.queue import QueueFullError, scheduler
+from core.rate_limit import build_limiter
 from core.security import create_signed_token, verify_signed_token
-from core.storage import job_dir
+from core.storage import cancel_marker, job_dir
+from core.uploads import MAX_FIELD_BYTES, StoredUpload, UploadFormError, UploadTooLargeError, receive_form, staging_path
+
 from models.schemas import AuthRequest, AuthResponse, JobCreateResponse, JobDetailResponse
 from pipeline import run_job
 
 app = FastAPI(title=settings.app_name, version=settings.app_version)
 
+max_upload_bytes = settings.max_upload_mb * 1024 * 1024
+# The form fields and multipart framing ride on top of the audio part.
+_UPLOAD_OVERHEAD_BYTES = MAX_FIELD_BYTES + 64 * 1024
+AUDIO_TYPES = {"audio/mpeg", "audio/wav", "audio/x-wav", "audio/aac", "audio/mp4"}
+# create_job reads the multipart body itself, so the form is described here for the OpenAPI schema.
+_CREATE_JOB_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["audio"],
+                    "properties": {
+                        "audio": {"type": "string", "format": "binary"},
+                        "prompt": {"type": "string", "default": ""},
+                        "lyrics": {"type": "string", "default": ""},
+                        "mode": {"type": "string", "enum": ["fast", "high"], "default": "fast"},
+                        "aspect_ratio": {"type": "string", "default": "16:9"},
+                        "auto_transcribe": {"type": "boolean", "default": False},
+                    },
+                }
+            }
+        },
+    }
+}
+
+
+# Registered before CORS so rejections still carry CORS headers.
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    if request.method == "POST" and request.url.path == "/api/jobs":
+        length = request.headers.get("content-length")
+        if length and length.isdigit() and int(length) > max_upload_bytes + _UPLOAD_OVERHEAD_BYTES:
+            return JSONResponse(status_code=413, content={"detail": "upload_too_large"})
+    return await call_next(request)
+
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=list(settings.allowed_origins),
     allow_origin_regex=r"^https?://(localhost|127\.0\.0\.1)(:\d+)?$",
     allow_credentials=True,
     allow_methods=["GET", "POST", "OPTIONS"],
-    allow_headers=["Content-Type", "X-User-Email"],
+    allow_headers=["Content-Type", "X-User-Email", "Last-Event-ID", "If-None-Match"],
+    expose_headers=["ETag"],
 )
 
-limiter = SlidingWindowLimiter(max_events=settings.max_jobs_per_minute)
+limiter = build_limiter(max_events=settings.max_jobs_per_minute)
+
+# With TUNIVO_JOB_RUNNER=worker this process only enqueues; `python -m worker` runs the pipeline.
+if settings.job_runner == "worker":
+    from core.job_queue import open_job_queue
+
+    dispatcher = open_job_queue()
+else:
+    dispatcher = scheduler
+
+TERMINAL_STATUSES = {"completed", "failed", "cancelled"}
 
 
 @app.post("/api/auth/login", response_model=AuthResponse)
@@ -38,87 +100,358 @@ async def login(payload: AuthRequest) -> AuthResponse:
     return AuthResponse(email=session.email, plan=session.plan)
 
 
-@app.post("/api/jobs", response_model=JobCreateResponse)
-async def create_job(
-    request: Request,
-    audio: UploadFile = File(...),
-    prompt: str = Form(""),
-    lyrics: str = Form(""),
-    mode: str = Form("fast"),
-    aspect_ratio: str = Form("16:9"),
-    auto_transcribe: bool = Form(False),
-) -> JobCreateResponse:
+@app.post("/api/jobs", response_model=JobCreateResponse, openapi_extra=_CREATE_JOB_BODY)
+async def create_job(request: Request) -> JobCreateResponse:
     email = request.headers.get("X-User-Email")
     session = session_from_email(email)
 
-    if not limiter.allow(session.email):
+    # The form is parsed by hand below, so these checks run before any of the upload is read.
+    # The SQLite limiter can wait on busy_timeout under contention; keep that off the event loop.
+    if not await asyncio.to_thread(limiter.allow, session.email):
         raise HTTPException(status_code=429, detail="rate_limited")
 
-    if mode not in {"fast", "high"}:
+    if not await asyncio.to_thread(dispatcher.accepting):
+        raise HTTPException(status_code=503, detail="queue_full", headers={"Retry-After": "30"})
+
+    try:
+        form = await receive_form(
+            request.headers.get("content-type", ""), request.stream(), "audio", staging_path(), max_upload_bytes, AUDIO_TYPES
+        )
+    except UploadTooLargeError:
+        raise HTTPException(status_code=413, detail="upload_too_large")
+    except UploadFormError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    try:
+        req = JobRequest(**{name: value for name, value in form.fields.items() if name in JobRequest.model_fields})
+    except ValidationError as exc:
+        form.upload.path.unlink(missing_ok=True)
+        raise RequestValidationError(exc.errors())
+    if req.mode not in {"fast", "high"}:
+        form.upload.path.unlink(missing_ok=True)
         raise HTTPException(status_code=400, detail="mode must be fast or high")
 
-    if audio.content_type not in {"audio/mpeg", "audio/wav", "audio/x-wav", "audio/aac", "audio/mp4"}:
-        raise HTTPException(status_code=400, detail="unsupported audio format")
+    job, audio_path = await asyncio.to_thread(_create_job_record, session, form.upload, Path(form.filename).name or "track.mp3")
 
-    req = JobRequest(
-        prompt=prompt,
-        lyrics=lyrics,
-        mode=mode,
-        aspect_ratio=aspect_ratio,
-        auto_transcribe=auto_transcribe,
+    try:
+        # The worker queue's submit is a BEGIN IMMEDIATE transaction, so it runs on the threadpool.
+        if dispatcher is scheduler:
+            placement = await asyncio.to_thread(
+                scheduler.submit, job.id, session.email, session.plan, run_job, job.id, req, audio_path
+            )
+        else:
+            payload = {"request": req.model_dump(), "audio_path": str(audio_path)}
+            placement = await asyncio.to_thread(dispatcher.submit, job.id, session.email, session.plan, payload)
+    except QueueFullError:
+        # Lost the race for the last slot while the upload streamed in.
+        await asyncio.to_thread(_discard_job, job.id, "queue_full")
+        raise HTTPException(status_code=503, detail="queue_full", headers={"Retry-After": "30"})
+    # EventSource cannot send X-User-Email, so the stream URL carries its own scoped token.
+    events_token = create_signed_token(
+        job_id=job.id, email=session.email, secret=settings.hmac_secret, ttl_seconds=settings.retention_hours * 3600, scope="events"
     )
+    return JobCreateResponse(id=job.id, events_url=f"/api/jobs/{job.id}/events?token={events_token}", **(placement or {}))
+
 
-    job = store.create(session)
-    workdir = job_dir(job.id)
-    audio_path = workdir / "input" / (audio.filename or "track.mp3")
+def _create_job_record(session: UserSession, upload: StoredUpload, filename: str) -> tuple[JobStatus, Path]:
+    job = store.create(session, audio_sha256=upload.sha256)
+    audio_path = job_dir(job.id) / "input" / filename
     audio_path.parent.mkdir(parents=True, exist_ok=True)
-    with audio_path.open("wb") as f:
-        shutil.copyfileobj(audio.file, f)
+    os.replace(upload.path, audio_path)
+    return job, audio_path
+
 
-    executor.submit(run_job, job.id, req, audio_path)
-    return JobCreateResponse(id=job.id)
+def _discard_job(job_id: str, reason: str) -> None:
+    store.update(job_id, status="failed", progress=1.0, message=reason)
+    shutil.rmtree(job_dir(job_id), ignore_errors=True)
 
 
 @app.get("/api/jobs/{job_id}", response_model=JobDetailResponse)
-async def get_job(job_id: str, request: Request) -> JobDetailResponse:
+async def get_job(
+    job_id: str,
+    request: Request,
+    wait: float = Query(0.0, ge=0.0),
+    fields: Optional[str] = Query(None),
+    compact: bool = Query(False),
+) -> Response:
     email = session_from_email(request.headers.get("X-User-Email")).email
-    job = store.get(job_id)
+    job = await asyncio.to_thread(store.get, job_id)
     if not job:
         raise HTTPException(status_code=404, detail="job not found")
     if job.user_email != email:
         raise HTTPException(status_code=403, detail="forbidden")
 
+    try:
+        include = _detail_fields(fields, compact, job.status)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    placement = await asyncio.to_thread(_queue_placement, job, include)
+
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match and _etag_matches(if_none_match, _job_etag(job.version, include, placement)):
+        if wait > 0 and job.status not in TERMINAL_STATUSES:
+            await _wait_for_version(job_id, job.version, min(wait, settings.long_poll_max_seconds))
+            job = await asyncio.to_thread(store.get, job_id)
+            if not job:
+                raise HTTPException(status_code=404, detail="job not found")
+            include = _detail_fields(fields, compact, job.status)
+            placement = await asyncio.to_thread(_queue_placement, job, include)
+        etag = _job_etag(job.version, include, placement)
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
     download_url = None
-    if job.result_path:
+    if job.result_path and (include is None or "download_url" in include):
         token = create_signed_token(job_id=job.id, email=email, secret=settings.hmac_secret)
         download_url = f"/api/jobs/{job.id}/download?token={token}"
+    preview_url = None
+    if job.preview_path and (include is None or "preview_url" in include):
+        preview_url = _preview_url(job, email)
 
-    return JobDetailResponse(
+    detail = JobDetailResponse.model_construct(
         id=job.id,
         status=job.status,
         progress=job.progress,
         message=job.message,
-        report=job.report,
+        report=job.report if include is None or "report" in include else {},
         plan=job.plan,
         download_url=download_url,
+        preview_url=preview_url,
+        **(placement or {}),
+    )
+    return JSONResponse(
+        detail.model_dump(include=include),
+        headers={"ETag": _job_etag(job.version, include, placement), "Cache-Control": "private, no-cache"},
     )
 
 
-@app.get("/api/jobs/{job_id}/download")
-async def download_job(job_id: str, token: str = Query(...)) -> FileResponse:
+@app.post("/api/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str, request: Request) -> dict:
+    email = session_from_email(request.headers.get("X-User-Email")).email
+    job = await asyncio.to_thread(store.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="job not found")
+    if job.user_email != email:
+        raise HTTPException(status_code=403, detail="forbidden")
+    if job.status in TERMINAL_STATUSES:
+        raise HTTPException(status_code=409, detail=f"job already {job.status}")
+
+    if await asyncio.to_thread(dispatcher.cancel, job_id):
+        # Never dispatched: no credits are held and nothing else will touch the job directory.
+        await asyncio.to_thread(shutil.rmtree, job_dir(job_id), True)
+        await asyncio.to_thread(store.update, job_id, status="cancelled", progress=1.0, message="Cancelled")
+        return {"id": job_id, "status": "cancelled"}
+
+    # Running (or about to run) somewhere: the pipeline polls for the marker, kills its ffmpeg
+    # runs, releases credits, removes the job directory and records the cancelled status.
+    try:
+        cancel_marker(job_id).touch()
+    except FileNotFoundError:
+        # The job directory is gone, so the job finished (or was cancelled) in the meantime.
+        pass
+    cancel_running(job_id)
+    return {"id": job_id, "status": "cancelling"}
+
+
+def _detail_fields(fields: Optional[str], compact: bool, status: str) -> Optional[set]:
+    if fields:
+        include = {name.strip() for name in fields.split(",") if name.strip()} | {"id"}
+        unknown = include - set(JobDetailResponse.model_fields)
+        if unknown:
+            raise ValueError(f"unknown fields: {', '.join(sorted(unknown))}")
+        return include
+    if compact and status not in TERMINAL_STATUSES:
+        # The report only stops growing once the job finishes; until then compact polls skip it.
+        return set(JobDetailResponse.model_fields) - {"report"}
+    return None
+
+
+def _queue_placement(job: JobStatus, include: Optional[set]) -> Optional[dict]:
+    if job.status != "queued" or (include is not None and not include & {"queue_position", "eta_seconds"}):
+        return None
+    return dispatcher.placement(job.id)
+
+
+def _job_etag(version: int, include: Optional[set], placement: Optional[dict] = None) -> str:
+    # Queue position moves without a store write, so it is part of the validator while queued.
+    tag = str(version) if placement is None else f"{version}q{placement['queue_position']}"
+    if include is None:
+        return f'W/"{tag}"'
+    return f'W/"{tag}-{"+".join(sorted(include))}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # Weak comparison: W/"x" and "x" name the same representation.
+    wanted = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == wanted for candidate in header.split(","))
+
+
+async def _wait_for_version(job_id: str, seen: int, timeout: float) -> None:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    with job_events.watch(job_id) as changed:
+        while True:
+            changed.clear()
+            if await asyncio.to_thread(store.version, job_id) != seen:
+                return
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            await wait_for_change(changed, min(settings.events_poll_seconds, remaining))
+
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events_stream(
+    job_id: str,
+    request: Request,
+    token: Optional[str] = Query(None),
+    last_event_id: Optional[int] = Query(None),
+) -> StreamingResponse:
+    if token is not None:
+        payload = verify_signed_token(token, settings.hmac_secret)
+        if not payload or payload.get("scope") != "events":
+            raise HTTPException(status_code=403, detail="invalid token")
+        if payload.get("job_id") != job_id:
+            raise HTTPException(status_code=403, detail="token mismatch")
+        email = payload["email"]
+    else:
+        email = session_from_email(request.headers.get("X-User-Email")).email
+    job = await asyncio.to_thread(store.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="job not found")
+    if job.user_email != email:
+        raise HTTPException(status_code=403, detail="forbidden")
+
+    # Browsers resend the last seen id as a header on reconnect; the query form is for first connects.
+    header_id = request.headers.get("Last-Event-ID", "")
+    resume_from = int(header_id) if header_id.isdigit() else last_event_id
+    return StreamingResponse(
+        _job_event_stream(job_id, email, resume_from),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _job_event_stream(job_id: str, email: str, resume_from: Optional[int]) -> AsyncIterator[str]:
+    heartbeat = max(1.0, settings.events_heartbeat_seconds)
+    # Updates made by other processes never reach this hub, so the version is re-read on a timer too.
+    poll = max(0.1, min(settings.events_poll_seconds, heartbeat))
+    sent = resume_from
+    idle = 0.0
+    with job_events.watch(job_id) as changed:
+        yield "retry: 3000\n\n"
+        job = await asyncio.to_thread(store.get, job_id)
+        if job is None or (job.version == sent and job.status in TERMINAL_STATUSES):
+            return
+        while True:
+            changed.clear()
+            version = await asyncio.to_thread(store.version, job_id)
+            if version is None:
+                return
+            if version != sent:
+                job = await asyncio.to_thread(store.get, job_id)
+                if job is None:
+                    return
+                yield _job_event(job, email)
+                sent = job.version
+                idle = 0.0
+                if job.status in TERMINAL_STATUSES:
+                    return
+            if idle >= heartbeat:
+                yield ": keep-alive\n\n"
+                idle = 0.0
+            timeout = min(poll, heartbeat - idle)
+            if not await wait_for_change(changed, timeout):
+                idle += timeout
+
+
+def _job_event(job: JobStatus, email: str) -> str:
+    data = {"id": job.id, "status": job.status, "progress": job.progress, "message": job.message}
+    if job.result_path:
+        token = create_signed_token(job_id=job.id, email=email, secret=settings.hmac_secret)
+        data["download_url"] = f"/api/jobs/{job.id}/download?token={token}"
+    if job.preview_path:
+        data["preview_url"] = _preview_url(job, email)
+    return f"id: {job.version}\nevent: job\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def _preview_url(job: JobStatus, email: str) -> str:
+    token = create_signed_token(job_id=job.id, email=email, secret=settings.hmac_secret, scope="preview")
+    return f"/api/jobs/{job.id}/preview?token={token}"
+
+
+def _verify_file_token(token: str, job_id: str, scope: str) -> None:
     payload = verify_signed_token(token, settings.hmac_secret)
     if not payload:
         raise HTTPException(status_code=403, detail="invalid token")
+    if payload.get("scope", "download") != scope:
+        raise HTTPException(status_code=403, detail="invalid token")
     if payload.get("job_id") != job_id:
         raise HTTPException(status_code=403, detail="token mismatch")
 
-    job = store.get(job_id)
+
+@app.get("/api/jobs/{job_id}/download")
+async def download_job(job_id: str, token: str = Query(...)) -> FileResponse:
+    _verify_file_token(token, job_id, "download")
+
+    job = await asyncio.to_thread(store.get, job_id)
     if not job or not job.result_path:
         raise HTTPException(status_code=404, detail="render not ready")
 
     return FileResponse(job.result_path, filename=f"tunivo-{job_id}.mp4", media_type="video/mp4")
 
 
+@app.get("/api/jobs/{job_id}/preview")
+async def preview_job(job_id: str, token: str = Query(...)) -> FileResponse:
+    _verify_file_token(token, job_id, "preview")
+
+    job = await asyncio.to_thread(store.get, job_id)
+    if not job or not job.preview_path:
+        raise HTTPException(status_code=404, detail="preview not ready")
+
+    return FileResponse(job.preview_path, filename=f"tunivo-{job_id}-preview.mp4", media_type="video/mp4")
+
+
+@app.get("/api/queue")
+async def queue_stats() -> dict:
+    return await asyncio.to_thread(dispatcher.stats)
+
+
+@app.get("/api/metrics")
+async def metrics() -> Response:
+    # The SQLite queue and limiter collectors query their databases, so render off the event loop.
+    body = await asyncio.to_thread(registry.render)
+    return Response(content=body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@registry.collector
+def _service_metrics() -> list[str]:
+    queue = dispatcher.stats()
+    caches = {"clip": clip_cache.stats(), "analysis": analysis_cache.stats()}
+    limits = limiter.stats()
+    return [
+        *gauge("tunivo_queue_depth", "Jobs waiting for a worker.", _by_label("plan", queue["depth_by_plan"])),
+        *gauge("tunivo_queue_running", "Jobs currently running.", _by_label("plan", queue["running_by_plan"])),
+        *gauge("tunivo_queue_avg_wait_seconds", "Moving average of queue wait.", {(): queue["avg_wait_seconds"]}),
+        *gauge("tunivo_queue_oldest_wait_seconds", "Age of the oldest waiting job.", {(): queue["oldest_wait_seconds"]}),
+        *gauge("tunivo_queue_dispatched_total", "Jobs handed to a worker.", {(): queue["dispatched"]}, "counter"),
+        *gauge("tunivo_queue_rejected_total", "Jobs refused because the queue was full.", {(): queue["rejected"]}, "counter"),
+        *gauge("tunivo_cache_hits_total", "Cache hits.", _by_label("cache", {name: c["hits"] for name, c in caches.items()}), "counter"),
+        *gauge("tunivo_cache_misses_total", "Cache misses.", _by_label("cache", {name: c["misses"] for name, c in caches.items()}), "counter"),
+        *gauge("tunivo_cache_hit_ratio", "Cache hit rate since start.", _by_label("cache", {name: c["hit_rate"] for name, c in caches.items()})),
+        *gauge("tunivo_rate_limit_allowed_total", "Job submissions let through by this process.", {(): limits["allowed"]}, "counter"),
+        *gauge("tunivo_rate_limit_rejected_total", "Job submissions rejected by this process.", {(): limits["rejected"]}, "counter"),
+        *gauge("tunivo_rate_limit_keys", "Users with live rate-limit state.", {(): limits["keys"]}),
+        *gauge("tunivo_event_watchers", "Open job event streams and long polls.", {(): job_events.watchers()}),
+    ]
+
+
+def _by_label(label: str, values: dict) -> dict:
+    return {((label, key),): value for key, value in values.items()}
+
+
 @app.get("/api/health")
 async def health() -> dict:
     return {"ok": True, "brand": "Tunivo.ai"}
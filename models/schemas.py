@@ -16,6 +16,9 @@ class AuthResponse(BaseModel):
 
 class JobCreateResponse(BaseModel):
     id: str
+    events_url: Optional[str] = None
+    queue_position: Optional[int] = None
+    eta_seconds: Optional[float] = None
 
 
 class JobDetailResponse(BaseModel):
@@ -26,6 +29,9 @@ class JobDetailResponse(BaseModel):
     report: dict
     plan: str
     download_url: Optional[str] = None
+    preview_url: Optional[str] = None
+    queue_position: Optional[int] = None
+    eta_seconds: Optional[float] = None
 
 
 class LedgerPreview(BaseModel):
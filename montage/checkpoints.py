@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from montage.assembler import Timeline, TimelineItem
+from montage.clip_plan import TimelinePlan, TimelineSegment
+from providers.mock_provider import GeneratedClip
+
+# Bump when a stage's stored shape changes; older checkpoints are then discarded, not misread.
+CHECKPOINT_VERSION = 1
+
+
+class JobCheckpoints:
+    """Stage outputs under <job dir>/checkpoints, so a retried run_job resumes after its last finished stage.
+
+    Checkpoints are keyed by the job's inputs; if the audio or request differ they are wiped.
+    """
+
+    def __init__(self, workdir: Path, fingerprint: str) -> None:
+        self.root = workdir / "checkpoints"
+        self._clip_lock = threading.Lock()
+        inputs = self.load("inputs")
+        if inputs is None or inputs.get("fingerprint") != fingerprint:
+            shutil.rmtree(self.root, ignore_errors=True)
+            self.save("inputs", {"fingerprint": fingerprint})
+
+    def load(self, stage: str) -> Optional[Any]:
+        try:
+            return json.loads((self.root / f"{stage}.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def save(self, stage: str, data: Any) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.root / f"{stage}.json"
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            tmp_path.write_text(json.dumps(data, separators=(",", ":")), encoding="utf-8")
+            os.replace(tmp_path, path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    def record_clip(self, clip: GeneratedClip) -> None:
+        # One line per finished clip, appended as Generate progresses; a torn last line is skipped on load.
+        line = json.dumps(clip_to_dict(clip), separators=(",", ":"))
+        with self._clip_lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            with (self.root / "clips.jsonl").open("a", encoding="utf-8") as handle:
+                handle.write(line + "\n")
+
+    def completed_clips(self, plan: TimelinePlan) -> Dict[int, GeneratedClip]:
+        segments = {segment.index: segment for segment in plan.segments}
+        completed: Dict[int, GeneratedClip] = {}
+        try:
+            lines = (self.root / "clips.jsonl").read_text(encoding="utf-8").splitlines()
+        except OSError:
+            return completed
+        for line in lines:
+            try:
+                clip = clip_from_dict(json.loads(line))
+            except (ValueError, KeyError, TypeError):
+                continue
+            segment = segments.get(clip.segment_index)
+            if segment is None or clip.prompt != segment.prompt or clip.duration != segment.duration:
+                continue
+            if _clip_on_disk(clip):
+                completed[clip.segment_index] = clip
+        return completed
+
+
+def checkpoint_fingerprint(audio_sha256: Optional[str], audio_path: Path, request: Dict) -> str:
+    if audio_sha256 is None:
+        stat = audio_path.stat()
+        audio_sha256 = f"{stat.st_size}:{stat.st_mtime_ns}"
+    raw = json.dumps({"audio": audio_sha256, "request": request, "version": CHECKPOINT_VERSION}, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def plan_to_dict(plan: TimelinePlan) -> Dict:
+    return asdict(plan)
+
+
+def plan_from_dict(data: Dict) -> TimelinePlan:
+    return TimelinePlan(
+        segments=[TimelineSegment(**segment) for segment in data["segments"]],
+        style_anchor=data["style_anchor"],
+        mode=data["mode"],
+    )
+
+
+def clip_to_dict(clip: GeneratedClip) -> Dict:
+    return {**asdict(clip), "path": str(clip.path)}
+
+
+def clip_from_dict(data: Dict) -> GeneratedClip:
+    return GeneratedClip(**{**data, "path": Path(data["path"])})
+
+
+def timeline_to_dict(timeline: Timeline) -> Dict:
+    return {
+        "items": [
+            {"segment": asdict(item.segment), "clip": clip_to_dict(item.clip), "transition": item.transition}
+            for item in timeline.items
+        ]
+    }
+
+
+def timeline_from_dict(data: Dict) -> Optional[Timeline]:
+    """Rebuild a stored timeline, or None if any of its clips has gone missing since it was saved."""
+    items = [
+        TimelineItem(
+            segment=TimelineSegment(**item["segment"]),
+            clip=clip_from_dict(item["clip"]),
+            transition=item["transition"],
+        )
+        for item in data["items"]
+    ]
+    if not all(_clip_on_disk(item.clip) for item in items):
+        return None
+    return Timeline(items=items)
+
+
+def _clip_on_disk(clip: GeneratedClip) -> bool:
+    try:
+        return clip.path.stat().st_size > 0
+    except OSError:
+        return False
@@ -3,6 +3,8 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Dict, List
 
+from core.config import settings
+
 
 @dataclass
 class TimelineSegment:
@@ -23,25 +25,37 @@ class TimelinePlan:
     mode: str
 
 
-def plan_timeline(audio_analysis: Dict, lyrics_summary: Dict, user_prompt: str) -> TimelinePlan:
+def plan_timeline(
+    audio_analysis: Dict, lyrics_summary: Dict, user_prompt: str, snap_to_bars: bool | None = None
+) -> TimelinePlan:
     duration = float(audio_analysis["duration"])
     bpm = int(audio_analysis["bpm"])
     base_len = 3.2 if bpm >= 120 else 4.0
     if audio_analysis.get("mode") == "fast":
         base_len += 0.8
+    if snap_to_bars is None:
+        snap_to_bars = settings.plan_snap_to_bars
+    bar = (60.0 / bpm) * 4 if snap_to_bars and bpm > 0 else 0.0
 
     style_anchor = user_prompt.strip() or _auto_style_anchor(audio_analysis, lyrics_summary)
     keywords = lyrics_summary.get("keywords", [])
     sections = audio_analysis.get("sections", [])
     energy_curve = audio_analysis.get("energy_curve", [])
 
+    section_at = _SectionSweep(sections)
+    energy_at = _EnergySweep(energy_curve)
+
     segments: List[TimelineSegment] = []
     t = 0.0
     idx = 0
     while t < duration:
-        end = min(duration, t + base_len)
-        section = _section_for_time(sections, t)
-        energy = _energy_for_time(energy_curve, t)
+        end = t + base_len
+        if bar:
+            # End on the bar line nearest base_len, at least one bar after this segment starts.
+            end = max(round(t / bar) + 1, round(end / bar)) * bar
+        end = min(duration, end)
+        section = section_at(t)
+        energy = energy_at(t)
         prompt = _segment_prompt(style_anchor, section, energy, keywords, idx)
         segments.append(
             TimelineSegment(
@@ -76,6 +90,50 @@ def _segment_prompt(style_anchor: str, section: str, energy: float, keywords: li
     return f"{style_anchor}, {section}, {intensity}, motif {motif}, premium composition"
 
 
+class _SectionSweep:
+    """Answers _section_for_time for non-decreasing t in amortised O(1) over time-ordered sections."""
+
+    def __init__(self, sections: list[Dict]) -> None:
+        self._sections = sections
+        self._ordered = all(
+            a["start"] <= a["end"] <= b["start"] for a, b in zip(sections, sections[1:])
+        )
+        self._pos = 0
+
+    def __call__(self, t: float) -> str:
+        if not self._ordered:
+            return _section_for_time(self._sections, t)
+        sections = self._sections
+        while self._pos < len(sections) and sections[self._pos]["end"] <= t:
+            self._pos += 1
+        # Skip empty sections sharing this boundary; they can never contain t.
+        pos = self._pos
+        while pos < len(sections) and sections[pos]["start"] <= t:
+            if t < sections[pos]["end"]:
+                return sections[pos]["label"]
+            pos += 1
+        return "verse"
+
+
+class _EnergySweep:
+    """Answers _energy_for_time for non-decreasing t in amortised O(1) over a time-ordered curve."""
+
+    def __init__(self, curve: list[Dict]) -> None:
+        self._curve = curve
+        self._ordered = all(a["time"] <= b["time"] for a, b in zip(curve, curve[1:]))
+        self._pos = 0
+
+    def __call__(self, t: float) -> float:
+        if not self._ordered:
+            return _energy_for_time(self._curve, t)
+        curve = self._curve
+        if not curve:
+            return 0.5
+        while self._pos + 1 < len(curve) and curve[self._pos + 1]["time"] <= t:
+            self._pos += 1
+        return float(curve[self._pos]["energy"])
+
+
 def _section_for_time(sections: list[Dict], t: float) -> str:
     for section in sections:
         if section["start"] <= t < section["end"]:
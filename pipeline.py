@@ -1,19 +1,38 @@
 from __future__ import annotations
 
+import logging
+import shutil
+import threading
+import time
 from pathlib import Path
 
 from agent.self_editing_agent import SelfEditingAgent
+from analysis.cache import analysis_cache
 from analysis.audio import analyze_audio
 from analysis.lyrics import summarize_lyrics
+from core.clip_cache import clip_cache
+from core.config import settings
 from core.jobs import JobRequest
 from core.jobs import store
-from core.storage import job_dir
+from core.metrics import JOB_SECONDS, carry_context, job_usage, stage
+from core.procs import JobCancelled, cancel_scope, check_cancelled, task_scope
+from core.storage import cancel_marker, job_dir
 from core.storage import schedule_retention_expiry
-from ledger.credits import CreditsLedger
-from montage.assembler import MontageAssembler
+from ledger.service import get_ledger
+from montage.assembler import MontageAssembler, Timeline
+from montage.checkpoints import (
+    JobCheckpoints,
+    checkpoint_fingerprint,
+    plan_from_dict,
+    plan_to_dict,
+    timeline_from_dict,
+    timeline_to_dict,
+)
 from montage.clip_plan import plan_timeline
 from providers.mock_provider import MockVideoProvider
-from renderer.exporter import render_timeline
+from renderer.exporter import prerender_windows, render_preview, render_timeline
+
+logger = logging.getLogger(__name__)
 
 
 def run_job(job_id: str, req: JobRequest, audio_path: Path) -> None:
@@ -21,69 +40,219 @@ def run_job(job_id: str, req: JobRequest, audio_path: Path) -> None:
     if not job:
         return
 
-    ledger = CreditsLedger(plan=job.plan)
-
-    try:
-        _validate_entitlements(job.plan, req.mode)
-
-        store.update(job_id, status="running", progress=0.05, message="Analyze")
-        audio_analysis = analyze_audio(audio_path, req.mode)
-
-        store.update(job_id, progress=0.15, message="Understand")
-        lyrics_summary = summarize_lyrics(req.lyrics)
-
-        estimate = ledger.estimate_cost(audio_analysis["duration"], req.mode)
-        ledger.reserve_credits(job_id, estimate)
-
-        store.update(job_id, progress=0.30, message="Plan")
-        timeline_plan = plan_timeline(audio_analysis, lyrics_summary, req.prompt)
-
-        store.update(job_id, progress=0.45, message="Generate")
-        workdir = job_dir(job_id)
-        clip_dir = workdir / "clips"
-        provider = MockVideoProvider(output_dir=clip_dir)
-        clips = provider.generate_clips(timeline_plan, req.aspect_ratio)
-
-        store.update(job_id, progress=0.62, message="Assemble")
-        assembler = MontageAssembler()
-        timeline = assembler.assemble(timeline_plan, clips)
-
-        store.update(job_id, progress=0.74, message="Self-edit")
-        agent = SelfEditingAgent(mode=req.mode)
-        budget = 4 if req.mode == "fast" else 12
-        improved_timeline, report = agent.improve(
-            timeline=timeline,
-            audio_analysis=audio_analysis,
-            lyrics_summary=lyrics_summary,
-            provider=provider,
-            aspect_ratio=req.aspect_ratio,
-            budget=budget,
-        )
-
-        store.update(job_id, progress=0.86, message="Export")
-        output_path = workdir / "output" / "tunivo.mp4"
-        render_timeline(improved_timeline, audio_path, output_path)
-
-        ledger.commit_credits(job_id)
-
-        report["duration_target_seconds"] = round(audio_analysis["duration"], 3)
-        report["duration_output_seconds"] = round(improved_timeline.duration, 3)
-        report["duration_delta_seconds"] = round(abs(audio_analysis["duration"] - improved_timeline.duration), 3)
-        report["plan"] = job.plan
-        report["mode"] = req.mode
-
-        store.update(
-            job_id,
-            status="completed",
-            progress=1.0,
-            message="Complete",
-            result_path=str(output_path),
-            report=report,
-            retention_expires_at=schedule_retention_expiry(),
-        )
-    except Exception as exc:
-        ledger.release_credits(job_id)
-        store.update(job_id, status="failed", message=str(exc), progress=1.0)
+    ledger = get_ledger()
+    workdir = job_dir(job_id)
+    resumed: list[str] = []
+    started = time.perf_counter()
+    status = "failed"
+    warmup = preview = None
+    marker = cancel_marker(job_id)
+
+    with job_usage() as usage, cancel_scope(job_id, marker.exists, settings.cancel_poll_seconds) as cancel:
+        try:
+            if marker.exists():
+                raise JobCancelled("cancelled")
+            _validate_entitlements(job.plan, req.mode)
+            checkpoints = JobCheckpoints(workdir, checkpoint_fingerprint(job.audio_sha256, audio_path, req.model_dump()))
+
+            store.update(job_id, status="running", progress=0.05, message="Analyze")
+            with stage("Analyze"):
+                analysis = checkpoints.load("analysis")
+                if analysis is None:
+                    audio_analysis = analyze_audio(audio_path, req.mode, content_hash=job.audio_sha256)
+                    store.update(job_id, progress=0.15, message="Understand")
+                    lyrics_summary = summarize_lyrics(req.lyrics)
+                    # The estimate is stored with the analysis so a retry reserves exactly the same amount.
+                    estimate = ledger.estimate_cost(audio_analysis["duration"], req.mode)
+                    checkpoints.save("analysis", {"audio": audio_analysis, "lyrics": lyrics_summary, "estimate": estimate})
+                else:
+                    audio_analysis, lyrics_summary, estimate = analysis["audio"], analysis["lyrics"], analysis["estimate"]
+                    resumed.append("analysis")
+
+            ledger.reserve_credits(job.user_email, job.plan, job_id, estimate)
+
+            check_cancelled()
+            store.update(job_id, progress=0.30, message="Plan")
+            with stage("Plan"):
+                stored_plan = checkpoints.load("plan")
+                if stored_plan is None:
+                    timeline_plan = plan_timeline(audio_analysis, lyrics_summary, req.prompt)
+                    checkpoints.save("plan", plan_to_dict(timeline_plan))
+                else:
+                    timeline_plan = plan_from_dict(stored_plan)
+                    resumed.append("plan")
+
+            check_cancelled()
+            store.update(job_id, progress=0.45, message="Generate")
+            with stage("Generate"):
+                clip_dir = workdir / "clips"
+                provider = MockVideoProvider(output_dir=clip_dir)
+                completed_clips = checkpoints.completed_clips(timeline_plan)
+                if completed_clips:
+                    resumed.append("clips")
+                clips = provider.generate_clips(
+                    timeline_plan, req.aspect_ratio, completed=completed_clips, on_clip=checkpoints.record_clip
+                )
+
+            check_cancelled()
+            store.update(job_id, progress=0.62, message="Assemble")
+            with stage("Assemble"):
+                assembler = MontageAssembler()
+                timeline = assembler.assemble(timeline_plan, clips)
+
+            stored_edit = checkpoints.load("timeline")
+            improved_timeline = timeline_from_dict(stored_edit["timeline"]) if stored_edit is not None else None
+
+            # Encode crossfade windows while the agent works; the export only re-encodes windows it changed.
+            window_dir = workdir / "render" / "windows"
+            warmup = _Background(_prerender_quietly, improved_timeline or timeline, window_dir)
+
+            # Something watchable early; it encodes next to the agent instead of delaying it.
+            preview_path = workdir / "output" / "preview.mp4"
+            if settings.preview_height > 0:
+                if preview_path.exists():
+                    resumed.append("preview")
+                    store.update(job_id, preview_path=str(preview_path))
+                else:
+                    check_cancelled()
+                    preview = _Background(_render_preview_quietly, job_id, timeline, audio_path, preview_path)
+
+            check_cancelled()
+            store.update(job_id, progress=0.74, message="Self-edit")
+            with stage("Self-edit"):
+                if improved_timeline is None:
+                    agent = SelfEditingAgent(mode=req.mode)
+                    budget = 4 if req.mode == "fast" else 12
+                    improved_timeline, report = agent.improve(
+                        timeline=timeline,
+                        audio_analysis=audio_analysis,
+                        lyrics_summary=lyrics_summary,
+                        provider=provider,
+                        aspect_ratio=req.aspect_ratio,
+                        budget=budget,
+                    )
+                    checkpoints.save("timeline", {"timeline": timeline_to_dict(improved_timeline), "report": report})
+                else:
+                    report = stored_edit["report"]
+                    resumed.append("timeline")
+
+            warmup.join()
+            check_cancelled()
+            store.update(job_id, progress=0.86, message="Export")
+            with stage("Export"):
+                output_path = workdir / "output" / "tunivo.mp4"
+                export_stats = render_timeline(improved_timeline, audio_path, output_path, window_dir=window_dir)
+
+            if preview is not None:
+                preview.join()
+            ledger.commit_credits(job.user_email, job_id)
+
+            report["duration_target_seconds"] = round(audio_analysis["duration"], 3)
+            report["duration_output_seconds"] = round(improved_timeline.duration, 3)
+            report["duration_delta_seconds"] = round(abs(audio_analysis["duration"] - improved_timeline.duration), 3)
+            report["plan"] = job.plan
+            report["generation"] = dict(provider.generation_stats)
+            report["clip_cache"] = clip_cache.stats()
+            report["analysis_cache"] = analysis_cache.stats()
+            report["export"] = export_stats
+            report["resumed_stages"] = resumed
+            report["resources"] = usage.report()
+            report["mode"] = req.mode
+
+            store.update(
+                job_id,
+                status="completed",
+                progress=1.0,
+                message="Complete",
+                result_path=str(output_path),
+                report=report,
+                retention_expires_at=schedule_retention_expiry(),
+            )
+            status = "completed"
+        except Exception as exc:
+            # Whatever failed, stop the background encodes and let them unwind before the job gets
+            # its final status, so nothing keeps writing into the workdir a retry may reuse.
+            for background in (warmup, preview):
+                if background is not None:
+                    background.cancel()
+                    background.join(reraise=False)
+            try:
+                ledger.release_credits(job.user_email, job_id)
+            except Exception:
+                # A failed journal or an unreachable ledger owner must not leave the job running forever.
+                logger.exception("could not release credits for job %s", job_id)
+            if isinstance(exc, JobCancelled) or cancel.cancelled:
+                status = "cancelled"
+                shutil.rmtree(workdir, ignore_errors=True)
+                store.update(job_id, status="cancelled", message="Cancelled", progress=1.0)
+            else:
+                store.update(job_id, status="failed", message=str(exc), progress=1.0)
+        finally:
+            JOB_SECONDS.observe(time.perf_counter() - started, mode=req.mode, status=status)
+
+
+class _Background:
+    """Runs fn on a daemon thread in the caller's job context; join() re-raises what fn raised.
+
+    fn runs under its own task scope, so cancel() kills its subprocesses without cancelling the job.
+    """
+
+    def __init__(self, fn, *args) -> None:
+        self._error: BaseException | None = None
+        self._lock = threading.Lock()
+        self._scope = None
+        self._cancelled = False
+        self._thread = threading.Thread(target=carry_context(self._run), args=(fn, args), daemon=True)
+        self._thread.start()
+
+    def cancel(self) -> None:
+        with self._lock:
+            self._cancelled = True
+            scope = self._scope
+        if scope is not None:
+            scope.cancel()
+
+    def join(self, reraise: bool = True) -> None:
+        self._thread.join()
+        if reraise and self._error is not None:
+            raise self._error
+
+    def _run(self, fn, args) -> None:
+        try:
+            with task_scope() as scope:
+                with self._lock:
+                    self._scope = scope
+                    if self._cancelled:
+                        scope.cancel()
+                fn(*args)
+        except BaseException as exc:
+            self._error = exc
+
+
+def _prerender_quietly(timeline: Timeline, window_dir: Path) -> None:
+    with stage("Prerender"):
+        try:
+            prerender_windows(timeline, window_dir)
+        except JobCancelled:
+            raise
+        except (OSError, RuntimeError):
+            # Best effort only: the export renders any window that is missing.
+            pass
+
+
+def _render_preview_quietly(job_id: str, timeline: Timeline, audio_path: Path, preview_path: Path) -> None:
+    with stage("Preview"):
+        try:
+            render_preview(timeline, audio_path, preview_path)
+        except JobCancelled:
+            raise
+        except (OSError, RuntimeError):
+            # The preview is optional; the job still produces the full export.
+            return
+    job = store.get(job_id)
+    # A job that failed or was cancelled meanwhile does not get a preview.
+    if job is not None and job.status == "running":
+        store.update(job_id, preview_path=str(preview_path))
 
 
 def _validate_entitlements(plan: str, mode: str) -> None:
@@ -1,9 +1,16 @@
 from __future__ import annotations
 
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List
+from typing import Callable, Dict, List
 
+from core.clip_cache import ClipCache, clip_cache
+from core.config import settings
+from core.metrics import carry_context
+from core.procs import check_cancelled, task_scope
+from core.slots import clip_slots
 from montage.clip_plan import TimelinePlan, TimelineSegment
 from renderer.mock_clip import render_clip
 
@@ -22,26 +29,84 @@ class GeneratedClip:
 class MockVideoProvider:
     name = "mock"
 
-    def __init__(self, output_dir: Path) -> None:
+    def __init__(self, output_dir: Path, concurrency: int | None = None, cache: ClipCache | None = clip_cache) -> None:
         self.output_dir = output_dir
+        self.cache = cache
+        self.concurrency = max(1, concurrency or settings.clip_concurrency)
+        self.generation_stats: Dict[str, int] = {"clips": 0, "reused": 0, "concurrency": self.concurrency, "max_in_flight": 0}
+        self._in_flight = 0
+        self._stats_lock = threading.Lock()
 
-    def generate_clips(self, plan: TimelinePlan, aspect_ratio: str) -> List[GeneratedClip]:
-        clips: list[GeneratedClip] = []
-        for segment in plan.segments:
-            seed = 1000 + segment.index * 17
-            clips.append(self.regenerate_clip(segment, aspect_ratio, seed))
-        return clips
+    def generate_clips(
+        self,
+        plan: TimelinePlan,
+        aspect_ratio: str,
+        completed: Dict[int, GeneratedClip] | None = None,
+        on_clip: Callable[[GeneratedClip], None] | None = None,
+    ) -> List[GeneratedClip]:
+        """Generate a clip per segment; clips in `completed` (from an earlier attempt) are reused as-is.
+
+        on_clip is called from worker threads as each new clip finishes.
+        """
+        completed = completed or {}
+        jobs = [(segment, 1000 + segment.index * 17) for segment in plan.segments if segment.index not in completed]
+        self.generation_stats.update(clips=len(plan.segments), reused=len(plan.segments) - len(jobs), max_in_flight=0)
+        if self.concurrency == 1 or len(jobs) <= 1:
+            clips = []
+            for segment, seed in jobs:
+                try:
+                    clips.append(self._generate_slot(segment, aspect_ratio, seed, on_clip))
+                except BaseException:
+                    # Earlier clips stay on disk for a resumed attempt; this one may be partial.
+                    self._clip_path(segment, seed).unlink(missing_ok=True)
+                    raise
+            return sorted([*completed.values(), *clips], key=lambda clip: clip.segment_index)
+
+        pool = ThreadPoolExecutor(max_workers=min(self.concurrency, len(jobs)), thread_name_prefix="clip")
+        # The renders share a scope, so a failed one can stop its siblings' ffmpeg runs as well.
+        with task_scope() as scope:
+            try:
+                futures = [
+                    pool.submit(carry_context(self._generate_slot), segment, aspect_ratio, seed, on_clip)
+                    for segment, seed in jobs
+                ]
+                done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+                failed = next((f for f in done if f.exception() is not None), None)
+                if failed is not None:
+                    scope.cancel()
+                    for future in pending:
+                        future.cancel()
+                    wait(pending)
+                    # Finished clips stay on disk for a resumed attempt; anything else may be partial.
+                    for future, (segment, seed) in zip(futures, jobs):
+                        if future.cancelled() or future.exception() is not None:
+                            self._clip_path(segment, seed).unlink(missing_ok=True)
+                    raise failed.exception()
+                clips = [future.result() for future in futures]
+            finally:
+                pool.shutdown(wait=True)
+        return sorted([*completed.values(), *clips], key=lambda clip: clip.segment_index)
 
     def regenerate_clip(self, segment: TimelineSegment, aspect_ratio: str, seed: int) -> GeneratedClip:
-        clip_path = self.output_dir / f"segment-{segment.index}-{seed}.mp4"
-        render_clip(
-            prompt=segment.prompt,
-            section=segment.section_label,
-            duration=segment.duration,
-            aspect_ratio=aspect_ratio,
-            seed=seed,
-            out_path=clip_path,
-        )
+        clip_path = self._clip_path(segment, seed)
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.key_for(
+                self.name, segment.prompt, segment.section_label, segment.duration, aspect_ratio, seed
+            )
+        if cache_key is None or not self.cache.fetch(cache_key, clip_path):
+            # The path may be a hardlink into the shared cache; never render through it.
+            clip_path.unlink(missing_ok=True)
+            render_clip(
+                prompt=segment.prompt,
+                section=segment.section_label,
+                duration=segment.duration,
+                aspect_ratio=aspect_ratio,
+                seed=seed,
+                out_path=clip_path,
+            )
+            if cache_key is not None:
+                self.cache.put(cache_key, clip_path)
         visual_hash = f"{segment.section_label}-{seed % 97}"
         return GeneratedClip(
             segment_index=segment.index,
@@ -53,3 +118,24 @@ class MockVideoProvider:
             visual_hash=visual_hash,
         )
 
+    def _generate_slot(
+        self, segment: TimelineSegment, aspect_ratio: str, seed: int, on_clip: Callable[[GeneratedClip], None] | None = None
+    ) -> GeneratedClip:
+        with clip_slots:
+            # Between clips: a cancelled job stops before taking another render.
+            check_cancelled()
+            with self._stats_lock:
+                self._in_flight += 1
+                if self._in_flight > self.generation_stats["max_in_flight"]:
+                    self.generation_stats["max_in_flight"] = self._in_flight
+            try:
+                clip = self.regenerate_clip(segment, aspect_ratio, seed)
+                if on_clip is not None:
+                    on_clip(clip)
+                return clip
+            finally:
+                with self._stats_lock:
+                    self._in_flight -= 1
+
+    def _clip_path(self, segment: TimelineSegment, seed: int) -> Path:
+        return self.output_dir / f"segment-{segment.index}-{seed}.mp4"
@@ -1,40 +1,338 @@
 from __future__ import annotations
 
-import subprocess
+import hashlib
+import json
+import math
+import os
+import shutil
+import uuid
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Dict, List, Tuple
 
-from montage.assembler import Timeline
+from analysis.audio import probe_audio_codec
+from core.config import settings
+from core.metrics import carry_context
+from core.procs import run_process, task_scope
+from montage.assembler import Timeline, TimelineItem
 
+CROSSFADE_SECONDS = 0.25
+CUT_SECONDS = 0.05
+# The part of a clip spent fading in, in whole 30 fps frames, so the frames one window keeps of
+# a clip's fade-in are exactly the frames the next window trims off.
+_FADE_IN_SECONDS = math.ceil(CROSSFADE_SECONDS * 30) / 30
+MP4_AUDIO_CODECS = {"aac", "mp3", "alac", "ac3", "eac3"}
+# Must match renderer/mock_clip.py so re-encoded pieces can be stream-copied next to raw clips.
+_VIDEO_ENCODE = ["-c:v", "libx264", "-pix_fmt", "yuv420p", "-r", "30"]
 
-def render_timeline(timeline: Timeline, audio_path: Path, output_path: Path) -> None:
+
+@dataclass(frozen=True)
+class _Source:
+    """One crossfade window input: `duration` seconds of the clip at `path`, from `start`."""
+
+    path: Path
+    duration: float
+    start: float = 0.0
+    # Trim the clip to `duration` even from its start: the head-only input of a window's last fade.
+    cut: bool = False
+
+
+def render_timeline(timeline: Timeline, audio_path: Path, output_path: Path, window_dir: Path | None = None) -> Dict:
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    temp_video = output_path.with_suffix(".video.mp4")
 
-    _render_video_with_transitions(timeline, temp_video)
+    # Video assembly and audio mux run in the same ffmpeg process; there is no intermediate video file.
+    if settings.export_assembly == "xfade":
+        _render_video_with_transitions(timeline, output_path, audio_path)
+        return {"assembly": "xfade"}
+    return _render_video_concat(timeline, output_path, audio_path, window_dir)
+
+
+def render_preview(timeline: Timeline, audio_path: Path | None, output_path: Path) -> Dict:
+    """Low-resolution proxy of a timeline in one ultrafast encode; transitions are hard cuts."""
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    list_path = output_path.with_name(f".{output_path.stem}.{uuid.uuid4().hex}.txt")
+    tmp_path = output_path.with_name(f".{output_path.stem}.{uuid.uuid4().hex}.tmp.mp4")
+    lines = []
+    for item in timeline.items:
+        escaped = str(item.clip.path.resolve()).replace("'", "'\\''")
+        lines.append(f"file '{escaped}'")
+    list_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    audio_inputs, audio_outputs = _audio_mux_args(audio_path, 1)
+    try:
+        _run(
+            [
+                "ffmpeg",
+                "-y",
+                "-f",
+                "concat",
+                "-safe",
+                "0",
+                "-i",
+                str(list_path),
+                *audio_inputs,
+                "-map",
+                "0:v:0",
+                "-vf",
+                f"fps=15,scale=-2:{settings.preview_height}",
+                "-c:v",
+                "libx264",
+                "-preset",
+                "ultrafast",
+                "-crf",
+                "32",
+                "-pix_fmt",
+                "yuv420p",
+                *audio_outputs,
+                "-movflags",
+                "+faststart",
+                str(tmp_path),
+            ],
+            kind="preview",
+        )
+        os.replace(tmp_path, output_path)
+    finally:
+        list_path.unlink(missing_ok=True)
+        tmp_path.unlink(missing_ok=True)
+    return {"height": settings.preview_height, "bytes": output_path.stat().st_size}
+
+
+def prerender_windows(timeline: Timeline, window_dir: Path) -> Dict:
+    """Warm the window store for a timeline that may still change; a later export reuses what survives."""
+    if settings.export_assembly == "xfade":
+        return {}
+    window_dir.mkdir(parents=True, exist_ok=True)
+    _, stats = _render_pieces(timeline, window_dir)
+    stats.pop("paths")
+    return stats
+
+
+def _audio_mux_args(audio_path: Path | None, input_index: int) -> tuple[list[str], list[str]]:
+    if audio_path is None:
+        return [], []
+    try:
+        codec = probe_audio_codec(audio_path)
+    except (OSError, RuntimeError):
+        codec = ""
+    audio_codec = "copy" if codec in MP4_AUDIO_CODECS else "aac"
+    return ["-i", str(audio_path)], ["-map", f"{input_index}:a:0", "-c:a", audio_codec, "-shortest"]
+
+
+def _render_video_concat(
+    timeline: Timeline, output_path: Path, audio_path: Path | None = None, window_dir: Path | None = None
+) -> Dict:
+    # With a window_dir, encoded windows outlive this call and are reused by the next export of the
+    # same job whenever their clips and transitions are unchanged.
+    pieces_dir = window_dir or output_path.with_suffix(".pieces")
+    pieces_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        pieces, stats = _render_pieces(timeline, pieces_dir)
+        _concat_copy(pieces, output_path, pieces_dir / "concat.txt", audio_path)
+    finally:
+        if window_dir is None:
+            shutil.rmtree(pieces_dir, ignore_errors=True)
+    if window_dir is not None:
+        _prune_windows(window_dir, set(stats.pop("paths")))
+    else:
+        stats.pop("paths")
+    return stats
+
+
+def _render_pieces(timeline: Timeline, pieces_dir: Path) -> Tuple[List[Path], Dict]:
+    max_inputs = max(2, settings.export_max_inputs)
+    stats = {"assembly": "concat", "windows_rendered": 0, "windows_reused": 0, "paths": []}
+    tasks = []
+    pieces: list[Path] = []
+    for group in _crossfade_groups(timeline):
+        if len(group) == 1:
+            pieces.append(group[0].clip.path)
+            continue
+        for window, pad, frames in _split_group(group, max_inputs):
+            piece = _window_path(pieces_dir, window, pad, frames)
+            tasks.append((window, piece, pad, frames))
+            pieces.append(piece)
+    with ThreadPoolExecutor(max_workers=max(1, settings.export_workers), thread_name_prefix="export") as pool:
+        _render_windows(pool, tasks, stats)
+    return pieces, stats
+
+
+def _split_group(group: List[TimelineItem], max_inputs: int) -> List[Tuple[List[_Source], float, int]]:
+    """Cut a crossfade run into windows of at most max_inputs inputs, each encoded once from the raw clips.
+
+    A window that does not end the run also takes the fade-in of the next clip, so the fade
+    across the cut happens inside it; the next window starts that clip right after the fade.
+    Concatenated, the windows are the run's full crossfade chain.
+
+    Fades can land between frames, so each window of a split run is held to the frame count of
+    its span in the unsplit chain; rounding then never adds up across windows. A run that fits
+    in one window keeps its natural length (frames 0).
+    """
+    if len(group) <= max_inputs:
+        bounds = [(0, len(group))]
+    else:
+        # One input per window is the next clip's fade-in; spread the clips evenly over the windows.
+        count = -(-len(group) // (max_inputs - 1))
+        size = -(-len(group) // count)
+        bounds = [(start, min(start + size, len(group))) for start in range(0, len(group), size)]
+    # Where each clip starts in the run's chain, and where the chain ends once padded to plan.
+    starts = [0.0]
+    for item in group[:-1]:
+        starts.append(starts[-1] + item.segment.duration - CROSSFADE_SECONDS)
+    planned = sum(item.segment.duration for item in group)
+    windows = []
+    for start, end in bounds:
+        window = []
+        for idx in range(start, end):
+            head = _FADE_IN_SECONDS if idx == start and start > 0 else 0.0
+            window.append(_Source(group[idx].clip.path, group[idx].segment.duration - head, head))
+        if end < len(group):
+            window.append(_Source(group[end].clip.path, _FADE_IN_SECONDS, 0.0, cut=True))
+        # Hold the last frame so the run keeps its planned length and later cuts stay on the grid.
+        pad = CROSSFADE_SECONDS * (len(group) - 1) if end == len(group) else 0.0
+        frames = 0
+        if len(bounds) > 1:
+            begin_at = starts[start] + _FADE_IN_SECONDS if start > 0 else 0.0
+            end_at = starts[end] + _FADE_IN_SECONDS if end < len(group) else planned
+            frames = round(end_at * 30) - round(begin_at * 30)
+        windows.append((window, pad, frames))
+    return windows
+
+
+def _window_path(pieces_dir: Path, sources: List[_Source], pad: float, frames: int) -> Path:
+    parts = []
+    for source in sources:
+        stat = source.path.stat()
+        parts.append(
+            [str(source.path), stat.st_size, stat.st_mtime_ns, round(source.duration, 3), round(source.start, 3), source.cut]
+        )
+    raw = json.dumps(
+        {"sources": parts, "pad": round(pad, 3), "frames": frames, "fade": CROSSFADE_SECONDS, "encode": _VIDEO_ENCODE},
+        separators=(",", ":"),
+    )
+    return pieces_dir / f"window-{hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]}.mp4"
+
+
+def _prune_windows(window_dir: Path, keep: set[Path]) -> None:
+    for path in window_dir.glob("window-*.mp4"):
+        if path not in keep:
+            path.unlink(missing_ok=True)
+
+
+def _crossfade_groups(timeline: Timeline) -> List[List[TimelineItem]]:
+    groups: list[list[TimelineItem]] = []
+    for idx, item in enumerate(timeline.items):
+        if idx > 0 and item.transition == "crossfade":
+            groups[-1].append(item)
+        else:
+            groups.append([item])
+    return groups
+
+
+def _render_windows(pool: ThreadPoolExecutor, tasks: List[Tuple[List[_Source], Path, float, int]], stats: Dict) -> None:
+    pending = []
+    for task in tasks:
+        stats["paths"].append(task[1])
+        if task[1].exists():
+            stats["windows_reused"] += 1
+            continue
+        pending.append(task)
+    stats["windows_rendered"] += len(pending)
+    # The windows share a scope, so a failed one also kills the encodes still running beside it.
+    with task_scope() as scope:
+        futures = [pool.submit(carry_context(_render_window_atomic), *task) for task in pending]
+        done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+        failed = next((f for f in done if f.exception() is not None), None)
+        if failed is not None:
+            scope.cancel()
+            for future in futures:
+                future.cancel()
+            wait(futures)
+            raise failed.exception()
+
+
+def _render_window_atomic(sources: List[_Source], output_path: Path, pad: float, frames: int) -> None:
+    tmp_path = output_path.with_name(f".{output_path.stem}.{uuid.uuid4().hex}.tmp.mp4")
+    try:
+        _render_crossfade_window(sources, tmp_path, pad, frames)
+        os.replace(tmp_path, output_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def _render_crossfade_window(sources: List[_Source], output_path: Path, pad: float, frames: int) -> None:
+    inputs = []
+    filters = []
+    for idx, source in enumerate(sources):
+        inputs.extend(["-i", str(source.path)])
+        trim = f"trim=start={source.start:.3f}:duration={source.duration:.3f}," if source.start > 0 or source.cut else ""
+        filters.append(f"[{idx}:v]{trim}setpts=PTS-STARTPTS,fps=30[v{idx}]")
+
+    cumulative = 0.0
+    last_label = "v0"
+    for idx in range(1, len(sources)):
+        cumulative += sources[idx - 1].duration
+        offset = max(0.0, cumulative - CROSSFADE_SECONDS * idx)
+        out_label = f"vxf{idx}"
+        filters.append(
+            f"[{last_label}][v{idx}]xfade=transition=fade:duration={CROSSFADE_SECONDS:.2f}:offset={offset:.3f}[{out_label}]"
+        )
+        last_label = out_label
+
+    if pad > 0:
+        filters.append(f"[{last_label}]tpad=stop_mode=clone:stop_duration={pad:.3f}[vout]")
+        last_label = "vout"
+    if frames:
+        # A frame of slack before the cut, in case the chain rounded a frame short.
+        filters.append(f"[{last_label}]tpad=stop_mode=clone:stop=1,trim=end_frame={frames}[vframes]")
+        last_label = "vframes"
 
     _run(
         [
             "ffmpeg",
             "-y",
+            *inputs,
+            "-filter_complex",
+            ";".join(filters),
+            "-map",
+            f"[{last_label}]",
+            *_VIDEO_ENCODE,
+            str(output_path),
+        ],
+        kind="export_window",
+    )
+
+
+def _concat_copy(pieces: List[Path], output_path: Path, list_path: Path, audio_path: Path | None = None) -> None:
+    lines = []
+    for piece in pieces:
+        escaped = str(piece.resolve()).replace("'", "'\\''")
+        lines.append(f"file '{escaped}'")
+    list_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    audio_inputs, audio_outputs = _audio_mux_args(audio_path, 1)
+    _run(
+        [
+            "ffmpeg",
+            "-y",
+            "-f",
+            "concat",
+            "-safe",
+            "0",
             "-i",
-            str(temp_video),
-            "-i",
-            str(audio_path),
+            str(list_path),
+            *audio_inputs,
             "-map",
             "0:v:0",
-            "-map",
-            "1:a:0",
             "-c:v",
             "copy",
-            "-c:a",
-            "aac",
-            "-shortest",
+            *audio_outputs,
             str(output_path),
-        ]
+        ],
+        kind="export_concat",
     )
 
 
-def _render_video_with_transitions(timeline: Timeline, output_path: Path) -> None:
+def _render_video_with_transitions(timeline: Timeline, output_path: Path, audio_path: Path | None = None) -> None:
+    audio_inputs, audio_outputs = _audio_mux_args(audio_path, len(timeline.items))
     if len(timeline.items) == 1:
         _run(
             [
@@ -42,28 +340,32 @@ def _render_video_with_transitions(timeline: Timeline, output_path: Path) -> Non
                 "-y",
                 "-i",
                 str(timeline.items[0].clip.path),
+                *audio_inputs,
+                "-map",
+                "0:v:0",
+                *audio_outputs,
                 "-c:v",
                 "libx264",
                 "-pix_fmt",
                 "yuv420p",
                 str(output_path),
-            ]
+            ],
+            kind="export_xfade",
         )
         return
 
-    fade_duration = 0.25
     inputs = []
     filters = []
     for idx, item in enumerate(timeline.items):
         inputs.extend(["-i", str(item.clip.path)])
-        filters.append(f"[{idx}:v]setpts=PTS-STARTPTS[v{idx}]")
+        filters.append(f"[{idx}:v]setpts=PTS-STARTPTS,fps=30[v{idx}]")
 
     cumulative = 0.0
     overlap_total = 0.0
     last_label = "v0"
     for idx in range(1, len(timeline.items)):
         transition = timeline.items[idx].transition
-        duration = fade_duration if transition == "crossfade" else 0.05
+        duration = CROSSFADE_SECONDS if transition == "crossfade" else CUT_SECONDS
         cumulative += timeline.items[idx - 1].segment.duration
         overlap_total += duration
         offset = max(0.0, cumulative - duration * idx)
@@ -87,21 +389,23 @@ def _render_video_with_transitions(timeline: Timeline, output_path: Path) -> Non
             "ffmpeg",
             "-y",
             *inputs,
+            *audio_inputs,
             "-filter_complex",
             filter_complex,
             "-map",
             f"[{last_label}]",
+            *audio_outputs,
             "-c:v",
             "libx264",
             "-pix_fmt",
             "yuv420p",
             str(output_path),
-        ]
+        ],
+        kind="export_xfade",
     )
 
 
-def _run(cmd: list[str]) -> None:
-    result = subprocess.run(cmd, capture_output=True, text=True, check=False)
+def _run(cmd: list[str], kind: str) -> None:
+    result = run_process(cmd, kind=kind)
     if result.returncode != 0:
         raise RuntimeError(result.stderr.strip() or "ffmpeg export failed")
-
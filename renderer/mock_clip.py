@@ -1,8 +1,9 @@
 from __future__ import annotations
 
-import subprocess
 from pathlib import Path
 
+from core.procs import run_process
+
 
 def render_clip(prompt: str, section: str, duration: float, aspect_ratio: str, seed: int, out_path: Path) -> Path:
     color = _color_from_seed(seed)
@@ -29,7 +30,7 @@ def render_clip(prompt: str, section: str, duration: float, aspect_ratio: str, s
 
 
 def _run(cmd: list[str]) -> None:
-    result = subprocess.run(cmd, capture_output=True, text=True, check=False)
+    result = run_process(cmd, kind="clip_render")
     if result.returncode != 0:
         raise RuntimeError(result.stderr.strip() or "ffmpeg clip render failed")
 
@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Settings are read at import, so the storage root has to point somewhere disposable before any
+# app module is imported.
+_storage = tempfile.mkdtemp(prefix="tunivo-tests-")
+os.environ["TUNIVO_STORAGE_DIR"] = _storage
+os.environ["TUNIVO_JOB_DB"] = str(Path(_storage) / "jobs.sqlite3")
+os.environ["TUNIVO_RATE_LIMIT_DB"] = str(Path(_storage) / "ratelimit.sqlite3")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
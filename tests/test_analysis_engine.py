@@ -0,0 +1,27 @@
+import random
+import subprocess
+import threading
+
+from analysis.engine import analyze_pcm
+
+
+def test_decode_survives_more_stderr_than_a_pipe_holds(tmp_path):
+    track = tmp_path / "track.mp3"
+    subprocess.run(
+        ["ffmpeg", "-y", "-v", "error", "-f", "lavfi", "-i", "sine=d=300", "-c:a", "libmp3lame", "-b:a", "64k", str(track)],
+        check=True,
+    )
+    # Damaged frames throughout make ffmpeg report an error per frame, far more than 64 KiB in total.
+    data = bytearray(track.read_bytes())
+    rng = random.Random(1)
+    for offset in range(4096, len(data), 700):
+        data[offset : offset + 40] = rng.randbytes(40)
+    track.write_bytes(bytes(data))
+
+    result = {}
+    worker = threading.Thread(target=lambda: result.update(analyze_pcm(track)), daemon=True)
+    worker.start()
+    worker.join(60)
+
+    assert not worker.is_alive(), "analysis is stuck behind a full stderr pipe"
+    assert result["duration"] > 0
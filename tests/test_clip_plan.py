@@ -0,0 +1,35 @@
+from pathlib import Path
+
+from agent.self_editing_agent import SelfEditingAgent
+from montage.assembler import Timeline, TimelineItem
+from montage.clip_plan import plan_timeline
+from providers.mock_provider import GeneratedClip
+
+TRACK = {"duration": 61.0, "bpm": 120, "mode": "high"}
+
+
+def test_bar_snapping_keeps_segment_length_and_ends_on_bar_lines():
+    plan = plan_timeline(TRACK, {}, "x", snap_to_bars=True)
+
+    # 120 bpm is a 2 s bar; the 3.2 s base length rounds to two bars, and the last segment ends with the track.
+    ends = [segment.end for segment in plan.segments]
+    assert ends == [4.0 * n for n in range(1, 16)] + [61.0]
+    assert [segment.start for segment in plan.segments[1:]] == ends[:-1]
+
+
+def test_snapped_segments_are_not_flagged_off_beat():
+    plan = plan_timeline(TRACK, {}, "x", snap_to_bars=True)
+    items = [
+        TimelineItem(
+            segment=segment,
+            clip=GeneratedClip(
+                segment.index, Path(f"clip-{segment.index}.mp4"), segment.prompt, segment.duration, 1000, "mock", f"h{segment.index}"
+            ),
+            transition="cut",
+        )
+        for segment in plan.segments
+    ]
+    issues = SelfEditingAgent()._detect_issues(Timeline(items=items), {"audio": TRACK})
+
+    # Only the final one-second remainder is not a whole number of bars.
+    assert [issue.segment_index for issue in issues if issue.reason == "off_beat"] == [len(plan.segments) - 1]
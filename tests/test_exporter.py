@@ -0,0 +1,34 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from core.procs import JobCancelled
+from renderer import exporter
+
+
+def test_failed_window_kills_the_windows_still_encoding(tmp_path, monkeypatch):
+    outcomes = []
+
+    def render(sources, output_path, pad, frames):
+        if output_path.name.startswith(".broken."):
+            time.sleep(0.3)
+            raise RuntimeError("window failed")
+        try:
+            exporter._run(["ffmpeg", "-re", "-f", "lavfi", "-i", "nullsrc=d=30", "-f", "null", "-"], kind="export_window")
+        except JobCancelled:
+            outcomes.append("killed")
+            raise
+        outcomes.append("finished")
+
+    monkeypatch.setattr(exporter, "_render_crossfade_window", render)
+    tasks = [([], tmp_path / name, 0.0, 0) for name in ("a.mp4", "b.mp4", "broken.mp4")]
+    stats = {"windows_rendered": 0, "windows_reused": 0, "paths": []}
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        with pytest.raises(RuntimeError, match="window failed"):
+            exporter._render_windows(pool, tasks, stats)
+
+    assert time.perf_counter() - started < 10
+    assert outcomes == ["killed", "killed"]
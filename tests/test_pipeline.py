@@ -0,0 +1,89 @@
+import time
+
+import pipeline
+import providers.mock_provider as mock_provider
+from core.auth import session_from_email
+from core.jobs import JobRequest, store
+from core.procs import JobCancelled, run_process
+from core.storage import job_dir
+from ledger.credits import CreditsLedger
+
+
+def _fake_analysis(audio_path, mode, content_hash=None):
+    return {"duration": 30.0, "bpm": 120, "mode": mode}
+
+
+def _plain_clip(prompt, section, duration, aspect_ratio, seed, out_path):
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    run_process(["ffmpeg", "-y", "-f", "lavfi", "-i", f"color=s=160x90:d={duration:.3f}", "-r", "30", str(out_path)], "clip_render")
+    return out_path
+
+
+def _new_job(email):
+    job = store.create(session_from_email(email))
+    audio_path = job_dir(job.id) / "input" / "track.mp3"
+    audio_path.parent.mkdir(parents=True, exist_ok=True)
+    audio_path.write_bytes(b"not really audio")
+    return job, audio_path
+
+
+def test_job_fails_when_ledger_journal_cannot_release(tmp_path, monkeypatch):
+    ledger = CreditsLedger(tmp_path / "ledger")
+    job, audio_path = _new_job("journal-failure@pro.tunivo")
+
+    def plan_fails(*args, **kwargs):
+        # Credits are reserved by now; the disk fills up before the job fails and releases them.
+        ledger._journal._error = OSError(28, "No space left on device")
+        raise RuntimeError("planning failed")
+
+    monkeypatch.setattr(pipeline, "get_ledger", lambda: ledger)
+    monkeypatch.setattr(pipeline, "analyze_audio", _fake_analysis)
+    monkeypatch.setattr(pipeline, "plan_timeline", plan_fails)
+
+    pipeline.run_job(job.id, JobRequest(prompt="x"), audio_path)
+
+    finished = store.get(job.id)
+    assert finished.status == "failed"
+    assert finished.message == "planning failed"
+    assert ledger.balance(job.user_email, job.plan)["reserved"] > 0
+    ledger._journal.close()
+
+
+def test_failed_job_stops_its_preview_encode(tmp_path, monkeypatch):
+    ledger = CreditsLedger(tmp_path / "ledger")
+    job, audio_path = _new_job("preview-failure@pro.tunivo")
+    preview_outcome = []
+
+    def slow_preview(timeline, audio_path, output_path):
+        try:
+            run_process(["ffmpeg", "-re", "-f", "lavfi", "-i", "nullsrc=d=30", "-f", "null", "-"], "preview")
+        except JobCancelled:
+            preview_outcome.append("killed")
+            raise
+        output_path.write_bytes(b"preview")
+        preview_outcome.append("finished")
+
+    class FailingAgent:
+        def __init__(self, mode):
+            pass
+
+        def improve(self, **kwargs):
+            time.sleep(0.2)
+            raise RuntimeError("self-edit failed")
+
+    monkeypatch.setattr(pipeline, "get_ledger", lambda: ledger)
+    monkeypatch.setattr(pipeline, "analyze_audio", _fake_analysis)
+    monkeypatch.setattr(mock_provider, "render_clip", _plain_clip)
+    monkeypatch.setattr(pipeline, "render_preview", slow_preview)
+    monkeypatch.setattr(pipeline, "SelfEditingAgent", FailingAgent)
+
+    started = time.perf_counter()
+    pipeline.run_job(job.id, JobRequest(prompt="x"), audio_path)
+
+    assert time.perf_counter() - started < 15
+    assert preview_outcome == ["killed"]
+    finished = store.get(job.id)
+    assert finished.status == "failed"
+    assert finished.message == "self-edit failed"
+    assert finished.preview_path is None
+    ledger.close()
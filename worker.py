@@ -0,0 +1,100 @@
+"""Out-of-process job runner: ``python -m worker [--processes N]``.
+
+The API enqueues into the SQLite job queue when TUNIVO_JOB_RUNNER=worker; this supervisor keeps
+N worker processes alive, each leasing one job at a time and running pipeline.run_job.
+"""
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from core.config import settings
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m worker", description="Run Tunivo pipeline workers.")
+    parser.add_argument("--processes", type=int, default=settings.job_workers, help="worker processes to keep running")
+    args = parser.parse_args(argv)
+    if settings.job_store != "sqlite":
+        raise SystemExit("worker processes need the shared job store (TUNIVO_JOB_STORE=sqlite)")
+    supervise(max(1, args.processes))
+
+
+def supervise(processes: int) -> None:
+    ctx = multiprocessing.get_context("spawn")
+    stopping = threading.Event()
+    children: Dict[int, multiprocessing.Process] = {}
+
+    def stop(signum, frame) -> None:
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    while not stopping.is_set():
+        for slot in range(processes):
+            child = children.get(slot)
+            if child is None or not child.is_alive():
+                # A crashed child's lease lapses and the job is picked up again by a live worker.
+                child = ctx.Process(target=serve, args=(f"{socket.gethostname()}-{os.getpid()}-{slot}",), daemon=False)
+                child.start()
+                children[slot] = child
+        stopping.wait(1.0)
+    for child in children.values():
+        if child.is_alive():
+            os.kill(child.pid, signal.SIGTERM)
+    for child in children.values():
+        child.join()
+
+
+def serve(owner: str) -> None:
+    # Imported here so the supervisor never loads the pipeline or opens the databases itself.
+    from core.job_queue import open_job_queue
+
+    queue = open_job_queue()
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while not stopping.is_set():
+        leased = queue.lease(owner, settings.worker_lease_seconds)
+        if leased is None:
+            stopping.wait(settings.worker_poll_seconds)
+            continue
+        run_leased(queue, leased, owner)
+
+
+def run_leased(queue, leased, owner: str) -> None:
+    from core.jobs import JobRequest, store
+    from pipeline import run_job
+
+    if leased.attempts > settings.worker_max_attempts:
+        store.update(leased.job_id, status="failed", progress=1.0, message="worker_lost")
+        queue.complete(leased.job_id, owner)
+        return
+
+    done = threading.Event()
+
+    def heartbeat() -> None:
+        while not done.wait(settings.worker_lease_seconds / 3):
+            if not queue.heartbeat(leased.job_id, owner, settings.worker_lease_seconds):
+                return
+
+    beat = threading.Thread(target=heartbeat, name="lease-heartbeat", daemon=True)
+    beat.start()
+    started = time.monotonic()
+    try:
+        run_job(leased.job_id, JobRequest(**leased.payload["request"]), Path(leased.payload["audio_path"]))
+    finally:
+        done.set()
+        beat.join()
+        queue.complete(leased.job_id, owner, runtime=time.monotonic() - started)
+
+
+if __name__ == "__main__":
+    main()